@@ -0,0 +1,231 @@
+import math
+from collections import deque
+import engine
+import feed
+
+# MARKET QUALITY ANALYTICS #
+
+#####
+# The analytics of a book are kept up to date as the book changes instead of
+# being worked out from a log afterwards. They are fed by the market data feed of
+# the book (see feed.py): every trade updates the traded volume, the VWAP and the
+# effective spread, and every change to the top of the book (a quote update)
+# updates the order-flow imbalance, the depth imbalance, the volatility of the mid
+# price and the realized spread of earlier trades. Each message takes a fixed
+# amount of work, however long the book has been running.
+#
+# All prices are in ticks. The statistics are:
+#
+#   vwap                the volume-weighted average price of every trade
+#   effective_spread    twice the signed distance between the price of a trade and
+#                       the mid price just before it (positive when the incoming
+#                       order paid to trade), averaged over the traded shares
+#   realized_spread     the same against the mid price horizon quote updates after
+#                       the trade, which leaves out the part of the spread that the
+#                       price moved by afterwards
+#   ofi                 the order-flow imbalance at the best prices (Cont, Kukanov
+#                       and Stoikov) summed over every quote update, and ofi_window
+#                       summed over the last window quote updates only
+#   depth_imbalance     (bid shares - ask shares) / (bid shares + ask shares) at the
+#                       best prices
+#   volatility          the standard deviation of the log returns of the mid price
+#                       over the last window quote updates
+#
+# A statistic that cannot be worked out yet (for example the VWAP before the first
+# trade) is None.
+#####
+
+# the price and the shares an empty side is treated as having, so that the order-flow imbalance stays defined
+NO_BID = (-1, 0)
+NO_ASK = (1 << 62, 0)
+
+#####
+# The analytics of one book. An Analytics object is a feed subscriber: the feed
+# hands it every message and it reads the top of the book as it stands.
+#####
+class Analytics:
+    __slots__ = ("book", "window", "horizon", "trades", "volume", "notional",
+                 "effective_total", "effective_volume", "realized_total", "realized_volume", "pending",
+                 "quotes", "bid", "bid_qty", "ask", "ask_qty", "mid", "ofi", "flows", "flow_total",
+                 "returns", "return_total", "return_squares", "aggressor", "trade_mid", "trade_quote")
+
+    def __init__(self, book, window=100, horizon=10):
+        self.book = book
+        self.window = window
+        self.horizon = horizon
+        self.trades = 0
+        self.volume = 0
+        self.notional = 0
+        self.effective_total = 0.0
+        self.effective_volume = 0
+        self.realized_total = 0.0
+        self.realized_volume = 0
+        self.pending = deque()
+        self.quotes = 0
+        self.ofi = 0
+        self.flows = deque()
+        self.flow_total = 0
+        self.returns = deque()
+        self.return_total = 0.0
+        self.return_squares = 0.0
+        self.aggressor = None
+        self.trade_mid = None
+        self.trade_quote = 0
+        self.bid, self.bid_qty, self.ask, self.ask_qty = self._top()
+        self.mid = self._mid(self.bid, self.ask)
+
+    def _top(self):
+        bids = self.book.bids
+        asks = self.book.asks
+        bid = engine.best_price(bids)
+        ask = engine.best_price(asks)
+        bid, bid_qty = NO_BID if bid is None else (bid, bids.levels[bid].volume)
+        ask, ask_qty = NO_ASK if ask is None else (ask, asks.levels[ask].volume)
+        return bid, bid_qty, ask, ask_qty
+
+    @staticmethod
+    def _mid(bid, ask):
+        if bid == NO_BID[0] or ask == NO_ASK[0]:
+            return None
+        return (bid + ask) / 2
+
+    def __call__(self, message):
+        _, kind, side, price, qty, _, order_id, _, _ = message
+
+        if kind == feed.TRADE:
+            self._record_trade(side, price, qty, order_id)
+        else:
+            # every change to the book ends with a message that is not a trade, so the quote is read
+            # here, and an order that has its own message is no longer in the middle of an execution
+            if order_id == self.aggressor:
+                self.aggressor = None
+
+            self._record_quote()
+
+    #####
+    # A trade is compared with the mid price from before the change it is part of,
+    # which is the same for every fill of an incoming order that walks the book, and
+    # its realized spread is due horizon quote updates after that mid price.
+    #####
+    def _record_trade(self, side, price, qty, order_id):
+        if order_id != self.aggressor:
+            self.aggressor = order_id
+            self.trade_mid = self.mid
+            self.trade_quote = self.quotes
+
+        self.trades += 1
+        self.volume += qty
+        self.notional += price * qty
+
+        if self.trade_mid is not None:
+            direction = 1 if side == engine.BUY else -1
+            self.effective_total += 2 * direction * (price - self.trade_mid) * qty
+            self.effective_volume += qty
+            self.pending.append((self.trade_quote + self.horizon, direction, price, qty))
+
+    def _record_quote(self):
+        bid, bid_qty, ask, ask_qty = self._top()
+
+        if bid == self.bid and bid_qty == self.bid_qty and ask == self.ask and ask_qty == self.ask_qty:
+            return
+
+        self.quotes += 1
+
+        # the order-flow imbalance of this update: shares added to the bid (or taken off the ask) count
+        # as buying pressure, shares taken off the bid (or added to the ask) as selling pressure
+        flow = ((bid_qty if bid >= self.bid else 0) - (self.bid_qty if bid <= self.bid else 0)
+                - (ask_qty if ask <= self.ask else 0) + (self.ask_qty if ask >= self.ask else 0))
+        self.ofi += flow
+        self.flow_total += flow
+        self.flows.append(flow)
+
+        if len(self.flows) > self.window:
+            self.flow_total -= self.flows.popleft()
+
+        mid = self._mid(bid, ask)
+
+        if mid is not None and self.mid is not None:
+            change = math.log(mid / self.mid)
+            self.return_total += change
+            self.return_squares += change * change
+            self.returns.append(change)
+
+            if len(self.returns) > self.window:
+                change = self.returns.popleft()
+                self.return_total -= change
+                self.return_squares -= change * change
+
+        self.bid, self.bid_qty, self.ask, self.ask_qty = bid, bid_qty, ask, ask_qty
+        self.mid = mid
+
+        # the trades that are horizon quote updates old are marked against the mid price now
+        pending = self.pending
+
+        while pending and pending[0][0] <= self.quotes:
+            _, direction, price, qty = pending.popleft()
+
+            if mid is not None:
+                self.realized_total += 2 * direction * (price - mid) * qty
+                self.realized_volume += qty
+
+    #####
+    # This method returns the statistics as a dictionary (see the top of the file),
+    # along with the number of trades, the traded shares and the number of quote
+    # updates seen so far.
+    #####
+    def snapshot(self):
+        n = len(self.returns)
+        volatility = None
+
+        if n > 1:
+            volatility = math.sqrt(max(self.return_squares - self.return_total * self.return_total / n, 0.0) / (n - 1))
+
+        has_bid = self.bid != NO_BID[0]
+        has_ask = self.ask != NO_ASK[0]
+        depth = self.bid_qty + self.ask_qty
+
+        return {"trades" : self.trades,
+                "volume" : self.volume,
+                "quotes" : self.quotes,
+                "vwap" : self.notional / self.volume if self.volume else None,
+                "effective_spread" : self.effective_total / self.effective_volume if self.effective_volume else None,
+                "realized_spread" : self.realized_total / self.realized_volume if self.realized_volume else None,
+                "ofi" : self.ofi,
+                "ofi_window" : self.flow_total,
+                "depth_imbalance" : (self.bid_qty - self.ask_qty) / depth if has_bid and has_ask and depth else None,
+                "mid" : self.mid,
+                "volatility" : volatility}
+
+#####
+# This function starts keeping analytics for a book and returns them. They are
+# fed by the feed of the book, and a feed is attached first if the book has none.
+# The realized spread is measured horizon quote updates after each trade, and the
+# rolling statistics cover the last window quote updates.
+#####
+def attach_analytics(book, window=100, horizon=10):
+    book_feed = book.feed if book.feed is not None else feed.attach_feed(book)
+    analytics = Analytics(book, window, horizon)
+    book_feed.subscribe(analytics)
+    return analytics
+
+def find_analytics(book):
+    if book.feed is not None:
+        for callback in book.feed.subscribers:
+            if isinstance(callback, Analytics):
+                return callback
+
+    return None
+
+def detach_analytics(book):
+    analytics = find_analytics(book)
+
+    if analytics is not None:
+        book.feed.unsubscribe(analytics)
+
+#####
+# This function returns the statistics of the analytics kept for a book, or None
+# if the book has none.
+#####
+def read_analytics(book):
+    analytics = find_analytics(book)
+    return None if analytics is None else analytics.snapshot()
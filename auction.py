@@ -0,0 +1,103 @@
+import numpy as np
+import batch
+import engine
+
+# CALL AUCTION #
+
+#####
+# This function returns the prices (in ticks) and the number of shares of every
+# price level on one side of the book, sorted by price from lowest to highest.
+#####
+def _levels(book_side):
+    levels = book_side.levels
+    prices = np.fromiter(levels.keys(), dtype=np.int64, count=len(levels))
+    volumes = np.fromiter((level.volume for level in levels.values()), dtype=np.int64, count=len(levels))
+    order = np.argsort(prices)
+    return prices[order], volumes[order]
+
+#####
+# This function finds the clearing price of a call auction. It builds the demand
+# curve (the number of shares bid at or above each price) and the supply curve (the
+# number of shares offered at or below each price) from cumulative sums over the
+# price levels, and looks both curves up at every price in the book with
+# searchsorted. The clearing price is the price at which the most shares can trade.
+# If several prices tie, the one that leaves the smallest imbalance between demand
+# and supply wins, and if there is still a tie, the middle one of those prices is
+# taken. The function returns the clearing price in ticks and the number of shares
+# that trade at it, or (None, 0) if the two sides of the book do not cross.
+#####
+def clearing_price(book):
+    bid_prices, bid_volumes = _levels(book.bids)
+    ask_prices, ask_volumes = _levels(book.asks)
+
+    if len(bid_prices) == 0 or len(ask_prices) == 0 or bid_prices[-1] < ask_prices[0]:
+        return None, 0
+
+    # only prices between the best ask and the best bid can trade
+    prices = np.union1d(bid_prices, ask_prices)
+    prices = prices[(prices >= ask_prices[0]) & (prices <= bid_prices[-1])]
+
+    demand_above = np.append(np.cumsum(bid_volumes[::-1])[::-1], 0)
+    supply_below = np.insert(np.cumsum(ask_volumes), 0, 0)
+    demand = demand_above[np.searchsorted(bid_prices, prices, side="left")]
+    supply = supply_below[np.searchsorted(ask_prices, prices, side="right")]
+
+    volume = np.minimum(demand, supply)
+    best = volume == volume.max()
+    imbalance = np.abs(demand - supply)
+    best &= imbalance == imbalance[best].min()
+    candidates = prices[best]
+
+    return int(candidates[(len(candidates) - 1) // 2]), int(volume.max())
+
+#####
+# This function pairs the buy orders and the sell orders that take part in the
+# auction. Both lists hold (order ID, shares, price) in priority order and add up
+# to the same number of shares. Lining up their cumulative sums gives every point
+# where either a buyer or a seller runs out, and each stretch between two such
+# points is one fill between the buyer and the seller that were active over it.
+#####
+def _pair(buys, sells, price, time):
+    buy_ids, buy_qty = np.array(buys, dtype=np.int64)[:, :2].T
+    sell_ids, sell_qty = np.array(sells, dtype=np.int64)[:, :2].T
+    buy_cum = np.cumsum(buy_qty)
+    sell_cum = np.cumsum(sell_qty)
+
+    edges = np.union1d(buy_cum, sell_cum)
+    fills = np.empty(len(edges), dtype=batch.FILL_DTYPE)
+    fills["aggressor_id"] = buy_ids[np.searchsorted(buy_cum, edges, side="left")]
+    fills["resting_id"] = sell_ids[np.searchsorted(sell_cum, edges, side="left")]
+    fills["price"] = price
+    fills["qty"] = np.diff(edges, prepend=0)
+    fills["time"] = time
+    return fills
+
+#####
+# This function uncrosses the book in a call auction. It finds the clearing price,
+# takes the shares that trade at that price off both sides of the book in priority
+# order (dropping whole price levels at a time where it can) and pairs the buyers
+# with the sellers. Every trade happens at the clearing price. The function returns
+# the clearing price in dollars (None if the book does not cross), the number of
+# shares traded and the fills as an array with the FILL_DTYPE layout, where the
+# aggressor_id field holds the buyer and the resting_id field holds the seller.
+#####
+def uncross(book, time=0):
+    price, volume = clearing_price(book)
+
+    if price is None:
+        return None, 0, np.empty(0, dtype=batch.FILL_DTYPE)
+
+    if book.journal is not None:
+        book.journal.record_uncross(time)
+
+    buys = engine.take_volume(book, book.bids, volume)
+    sells = engine.take_volume(book, book.asks, volume)
+    fills = _pair(buys, sells, price, time)
+
+    if book.journal is not None:
+        book.journal.record_fills(fills.tolist())
+
+    if book.feed is not None:
+        book.feed.record_uncross(book, fills.tolist(), buys, sells)
+
+    return engine.to_price(price), volume, fills
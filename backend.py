@@ -1,71 +1,120 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime
-from datetime import timedelta
+import time
+from itertools import islice
+import engine
 
 # BACKEND #
 
+# pandas and NumPy (along with snapshot.py, which needs NumPy) are only imported by the functions that
+# build data frames or read and write snapshots, so the web tier starts without loading them
+
+# The clock of the simulation runs 4 hours behind the clock of the server
+CLOCK_OFFSET_NS = 4 * 3600 * 10**9
+
+#####
+# Time stamps are whole nanoseconds since the epoch (int64), so the engine only
+# ever stores and compares plain integers. This function returns the time stamp
+# of an order placed now.
 #####
-# This function is designed to initialize a limit order book before any orders
-# are placed. The first two columns correspond to the bid side and the last
-# two columns correspond to the ask side. All of the entries are initialized
-# to NaN to indicate that there is no data present in the initial limit order
-# book. One important distinction to note from a typical limit order book is
-# that we are not keeping track of the number of shares for each order. This
-# is due to the assumption that an order will either be to buy 1 share or to
-# sell 1 share. This function returns a data frame which can be assigned to a
-# variable as the limit order book.
+def now_ns():
+    return time.time_ns() - CLOCK_OFFSET_NS
+
+#####
+# This function is designed to initialize a limit order book before any orders are
+# placed. The book is held by the matching engine, which keeps the bid side and
+# the ask side as sorted price levels with a queue of orders at each price. There
+# is no fixed number of rows, so the book grows with the resting orders. Each
+# order keeps track of the number of shares it still has open, and each price
+# level keeps the total number of shares resting at that price. This function
+# returns the empty book which can be assigned to a variable as the limit order
+# book.
 #####
 def init_lob():
-    return pd.DataFrame(np.nan, index=list(range(101)), columns=["Time Bid Side", "Price Bid Side", "Time Ask Side", "Price Ask Side"])
+    return engine.init_book()
 
 #####
-# This helper function processes a datetime object and turns it into a string.
+# This helper function turns a time stamp into the string shown on the website.
 #####
-def reformat_lob_helper(x):
-    if isinstance(x, datetime):
-        return x.strftime("%I:%M:%S %p")
-    else:
-        return x
+def format_time(x):
+    return time.strftime("%I:%M:%S %p", time.localtime(x // 10**9))
 
 #####
-# This function prepares the limit order book dataframe for printing on the website.
+# This function is a read-only view of one side of the book for display. It
+# yields a (time, shares, price) row for each of the first rows resting orders (all
+# of them if rows is None) in priority order, with the time formatted and the price
+# in dollars. The rows are formatted one at a time as they are read, so only the
+# rows that are shown are ever formatted, and the book itself is never changed.
 #####
-def reformat_lob(lob):
-    lob["Time Bid Side"] = lob["Time Bid Side"].apply(reformat_lob_helper)
-    lob["Time Ask Side"] = lob["Time Ask Side"].apply(reformat_lob_helper)
-    return lob
+def display_rows(book_side, rows=None):
+    for order in islice(engine.iter_orders(book_side), rows):
+        yield format_time(order.time), order.qty, engine.to_price(order.price)
 
 #####
-# This function prepares the new order dataframe for printing on the website.
+# This function prepares the limit order book for printing on the website. The
+# resting orders are laid out in a new data frame where the first three columns
+# correspond to the bid side and the last three columns correspond to the ask side,
+# both sorted by priority. Only the first rows orders of each side are shown if
+# rows is given, and the shorter side is padded with NaN.
 #####
-def reformat_order(order):
-    if isinstance(order["Order Time"][0], datetime):
-        order["Order Time"][0] = order["Order Time"][0].strftime("%I:%M:%S %p")
+def reformat_lob(lob, rows=None):
+    import pandas as pd
 
-    return order
+    bids = list(display_rows(lob.bids, rows))
+    asks = list(display_rows(lob.asks, rows))
+    n = max(len(bids), len(asks))
+
+    bids += [(float("nan"),) * 3] * (n - len(bids))
+    asks += [(float("nan"),) * 3] * (n - len(asks))
+
+    return pd.DataFrame(data={"Time Bid Side" : [row[0] for row in bids],
+                              "Shares Bid Side" : [row[1] for row in bids],
+                              "Price Bid Side" : [row[2] for row in bids],
+                              "Time Ask Side" : [row[0] for row in asks],
+                              "Shares Ask Side" : [row[1] for row in asks],
+                              "Price Ask Side" : [row[2] for row in asks]})
+
+#####
+# This function returns the bid-ask spread (see get_spread) and the book table
+# (see reformat_lob) of the main page, read from the book at the same moment.
+#####
+def page_tables(book):
+    return get_spread(book), reformat_lob(book)
+
+#####
+# This function prepares the new order dataframe for printing on the website. It
+# returns a copy with the time formatted and leaves the order itself unchanged.
+#####
+def reformat_order(order):
+    return order.assign(**{"Order Time" : [format_time(x) for x in order["Order Time"]]})
 
 #####
 # This function is designed to randomly generate an order. The order will randomly
 # be assigned as either a market or limit order. We will assume that an order has
-# a 90% chance of being a limit order and a 10% chance of being a market order. Note
-# that if a market buy/sell order is placed and there is no corresponding ask/bid
-# order in the limit order book to fulfill the market order immediately, then the
-# market order will fail to execute and be dropped. Additionally, the order will
-# randomly be assigned as either a buy or sell order with equal probability. The
-# order will also be assigned a time stamp that indicates the time that the order
-# was placed. Finally, the order will be randomly assigned a price that falls within
-# a realistic range of possible prices. For example, it doesn't make much sense to
-# create a $1000 order for an asset trading at $100. In this simulation, we will select
-# a random price between $70 and $80, with each price being equally likely. Also, note
-# that we will assign a price of NaN to an order if it is a market order to indicate that
-# the price is not applicable to the market order. This is just for convention. This
-# function returns a data frame containing the order attributes. This function is used
-# as input to the process_order function that processes the order and (if necessary)
+# a 90% chance of being a limit order and a 10% chance of being a market order.
+# Note that if a market buy/sell order is placed and there is no corresponding
+# ask/bid order in the limit order book to fulfill the market order immediately,
+# then the market order will fail to execute and be dropped. Additionally, the
+# order will randomly be assigned as either a buy or sell order with equal
+# probability. The order will also be assigned a time stamp (in nanoseconds since
+# the epoch) that indicates the time that the order was placed. Finally, the order
+# will be randomly assigned a price that falls within a realistic range of
+# possible prices. For example, it doesn't make much sense to create a $1000 order
+# for an asset trading at $100. In this simulation, we will select a random price
+# between $70 and $80, with each price being equally likely. Also, note that we
+# will assign a price of NaN to an order if it is a market order to indicate that
+# the price is not applicable to the market order. This is just for convention.
+# Each order is for 1 share, which is recorded in the order's quantity. The order
+# is given an order ID by the book it is processed in (unless an order ID is given
+# here, which should come from engine.next_order_id of that book), which is how it
+# can later be cancelled or replaced once it rests in the book. This function
+# returns a data frame containing the order attributes. This function is used as
+# input to the process_order function that processes the order and (if necessary)
 # adds it to the limit order book.
 #####
-def gen_order():
-    time = datetime.now() - timedelta(hours=4)
+def gen_order(order_id=None):
+    import numpy as np
+    import pandas as pd
+
+    time = now_ns()
     type_binary = np.random.choice([0,1], size=1, replace=True, p=[0.9, 0.1])[0]
     type = "Market"
     direction_binary = np.random.choice([1,-1], size=1, replace=True)[0]
@@ -79,160 +128,111 @@ def gen_order():
     if direction_binary == 1:
         direction = "Buy"
 
-    return pd.DataFrame(data={"Order Time" : [time], "Order Type" : [type], "Order Direction" : [direction], "Order Price" : [price]})
+    order = pd.DataFrame(data={"Order Time" : [time], "Order Type" : [type], "Order Direction" : [direction], "Order Price" : [price], "Order Quantity" : [1]})
+
+    if order_id is not None:
+        order.insert(0, "Order ID", [order_id])
+
+    return order
 
 #####
 # This function is designed to compute the bid-ask spread. The bid-ask spread
 # is defined as the price difference between the highest bid and the lowest ask.
 # A string is returned with the bid-ask spread. If no bid-ask spread exists, then
-# we simply return a dash.
+# we simply return a dash. The best bid and the best ask are kept up to date by the
+# engine, so this does not look through the book.
 #####
 def get_spread(book):
-    if (np.isnan(book["Price Bid Side"][0]) or np.isnan(book["Price Ask Side"][0])):
+    spread = engine.spread(book)
+
+    if spread is None:
         return "-"
     else:
-        return "$" + "{:.2f}".format(book["Price Ask Side"][0] - book["Price Bid Side"][0])
+        return "$" + "{:.2f}".format(engine.to_price(spread))
 
 #####
-# This function processes an order to the limit order book. The function returns the
-# modified book which we will assign to the prior book variable in order to reflect
-# the change.
+# This function returns the aggregated depth for the top n price levels on each
+# side of the book. Each level is given as a (price, shares, number of orders)
+# tuple with the price in dollars, starting with the best price. The depth comes
+# from the engine's cache, which is only rebuilt after a change near the top of
+# the book.
+#####
+def get_depth(book, n=engine.DEPTH_LEVELS):
+    return {"bids" : [(engine.to_price(price), shares, count) for price, shares, count in engine.get_depth(book.bids, n)],
+            "asks" : [(engine.to_price(price), shares, count) for price, shares, count in engine.get_depth(book.asks, n)]}
+
+#####
+# This function processes an order to the limit order book. The order is handed to
+# the matching engine, which matches it with the best orders on the opposite side
+# (sweeping through several price levels if needed) and adds whatever is left of a
+# limit order to the book at its price level. An order that does not carry an order
+# ID is assigned the next free ID of the book, and an order without a quantity is
+# for 1 share. The function returns the modified book which we will assign to the
+# prior book variable in order to reflect the change.
 #####
 def process_order(book, new_order):
-    if new_order["Order Type"][0] == "Market":
-        if new_order["Order Direction"][0] == "Buy":
-            # process a market-buy order
+    side = engine.BUY if new_order["Order Direction"][0] == "Buy" else engine.SELL
 
-            # this if statement handles the case of when there are no asks
-            if np.isnan(book["Price Ask Side"][0]):
-                print("market order could not be executed due to 0 entries in ask side of limit order book")
-                return book
-            else:
-                # match the market-buy with the top ask order in the limit order book
+    if "Order ID" in new_order.columns:
+        order_id = int(new_order["Order ID"][0])
+    else:
+        order_id = engine.next_order_id(book)
 
-                for i in range(100):
-                    book["Time Ask Side"][i] = book["Time Ask Side"][i+1]
-                    book["Price Ask Side"][i] = book["Price Ask Side"][i+1]
+    if "Order Quantity" in new_order.columns:
+        qty = int(new_order["Order Quantity"][0])
+    else:
+        qty = 1
 
-                return book
+    time = int(new_order["Order Time"][0])
+
+    if new_order["Order Type"][0] == "Market":
+        status = engine.submit_order(book, engine.MARKET, side, 0, qty, time, order_id)
+    else:
+        price = engine.to_ticks(new_order["Order Price"][0])
+        status = engine.submit_order(book, engine.LIMIT, side, price, qty, time, order_id)
+
+    if status == engine.REJECTED:
+        if side == engine.BUY:
+            print("market order could not be executed due to 0 entries in ask side of limit order book")
         else:
-            # process a market-sell order
+            print("market order could not be executed due to 0 entries in bid side of limit order book")
+
+    return book
 
-            # this if statement handles the case of when there are no bids
-            if np.isnan(book["Price Bid Side"][0]):
-                print("market order could not be executed due to 0 entries in bid side of limit order book")
-                return book
-            else:
-                # match the market-sell with the top bid order in the limit order book
+#####
+# This function cancels the resting order with the given order ID. The function
+# returns the modified book, which is unchanged if no such order is resting.
+#####
+def cancel_order(book, order_id):
+    engine.cancel_order(book, order_id)
+    return book
 
-                for i in range(100):
-                    book["Time Bid Side"][i] = book["Time Bid Side"][i+1]
-                    book["Price Bid Side"][i] = book["Price Bid Side"][i+1]
+#####
+# This function replaces the price and/or the quantity of the resting order with
+# the given order ID (None keeps the current value). An order whose quantity is only
+# reduced keeps its place in the queue. Otherwise the order keeps its ID but moves
+# to the back of the queue at its new price, and it is matched right away if the
+# new price crosses the book. The function returns the modified book, which is
+# unchanged if no such order is resting.
+#####
+def replace_order(book, order_id, new_price=None, new_quantity=None):
+    price = None if new_price is None else engine.to_ticks(new_price)
+    engine.replace_order(book, order_id, price, new_quantity, now_ns())
+    return book
 
-                return book
-    else:
-        if new_order["Order Direction"][0] == "Buy":
-            # process a limit-buy order
-
-            # this checks if there is an ask to match the limit-buy order
-            if np.isnan(book["Price Ask Side"][0]) == False and new_order["Order Price"][0] >= book["Price Ask Side"][0]:
-                # match the limit-buy with the top ask order in the limit order book
-
-                for i in range(100):
-                    book["Time Ask Side"][i] = book["Time Ask Side"][i+1]
-                    book["Price Ask Side"][i] = book["Price Ask Side"][i+1]
-
-                return book
-            else:
-                # the limit-buy order condition is not met so add it to the book
-
-                i = 0
-                # this while loop makes sure we don't inspect NaN cells
-                while np.isnan(book["Price Bid Side"][i]) == False:
-                    # this if statement checks if we have located the necessary place for insertion
-                    if new_order["Order Price"][0] < book["Price Bid Side"][i]:
-                        # we need to insert lower in the book so we go to the next row
-                        i += 1
-                    elif new_order["Order Price"][0] > book["Price Bid Side"][i]:
-                        # we insert here
-                        for j in range(99, i-1, -1):
-                            book["Price Bid Side"][j+1] = book["Price Bid Side"][j]
-                            book["Time Bid Side"][j+1] = book["Time Bid Side"][j]
-
-                        book["Price Bid Side"][i] = new_order["Order Price"][0]
-                        book["Time Bid Side"][i] = new_order["Order Time"][0]
-
-                        return book
-                    else:
-                        # in this case, the prices are equal so we compare time stamps
-                        if new_order["Order Time"][0] < book["Time Bid Side"][i]:
-                            # we insert here
-                            for j in range(99, i-1, -1):
-                                book["Price Bid Side"][j+1] = book["Price Bid Side"][j]
-                                book["Time Bid Side"][j+1] = book["Time Bid Side"][j]
-
-                            book["Price Bid Side"][i] = new_order["Price"][0]
-                            book["Time Bid Side"][i] = new_order["Order Time"][0]
-
-                            return book
-                        else:
-                            # we need to insert lower in the book so we go to the next row
-                            i += 1
-
-                # if this code is reached then we insert at the very bottom
-                book["Time Bid Side"][i] = new_order["Order Time"][0]
-                book["Price Bid Side"][i] = new_order["Order Price"][0]
-
-                return book
-        else:
-            # process a limit-sell order
-
-            # this checks if there is a bid to match the limit-sell order
-            if np.isnan(book["Price Bid Side"][0]) == False and new_order["Order Price"][0] <= book["Price Bid Side"][0]:
-                # match the limit-sell with the top bid order in the limit order book
-                for i in range(100):
-                    book["Time Bid Side"][i] = book["Time Bid Side"][i+1]
-                    book["Price Bid Side"][i] = book["Price Bid Side"][i+1]
-
-                return book
-            else:
-                # the limit-sell order condition is not met so add it to the book
-                i = 0
-
-                # this while loop makes sure we don't inspect NA cells
-                while np.isnan(book["Price Ask Side"][i]) == False:
-                    # this if statement checks if we have located the necessary place for insertion
-                    if new_order["Order Price"][0] > book["Price Ask Side"][i]:
-                        # we need to insert lower in the book so we go to the next row
-                        i += 1
-                    elif new_order["Order Price"][0] < book["Price Ask Side"][i]:
-                        # we insert here
-                        for j in range(99, i-1, -1):
-                            book["Price Ask Side"][j+1] = book["Price Ask Side"][j]
-                            book["Time Ask Side"][j+1] = book["Time Ask Side"][j]
-
-                        book["Price Ask Side"][i] = new_order["Order Price"][0]
-                        book["Time Ask Side"][i] = new_order["Order Time"][0]
-
-                        return book
-                    else:
-                        # in this case, the prices are equal so we compare time stamps
-                        if new_order["Order Time"][0] < book["Time Ask Side"][i]:
-                            # we insert here
-                            for j in range(99, i-1, -1):
-                                book["Price Ask Side"][j+1] = book["Price Ask Side"][j]
-                                book["Time Ask Side"][j+1] = book["Time Ask Side"][j]
-
-                            book["Price Ask Side"][i] = new_order["Order Price"][0]
-                            book["Time Ask Side"][i] = new_order["Order Time"][0]
-
-                            return book
-                        else:
-                            # we need to insert lower in the book so we go to the next row
-                            i += 1
-
-                # if this code is reached then we insert at the very bottom
-                book["Time Ask Side"][i] = new_order["Order Time"][0]
-                book["Price Ask Side"][i] = new_order["Order Price"][0]
-
-                return book
\ No newline at end of file
+#####
+# This function saves the limit order book to a snapshot file, including the time
+# stamp and order ID of every resting order.
+#####
+def save_lob(book, path):
+    import snapshot
+    snapshot.save_snapshot(book, path)
+
+#####
+# This function loads a limit order book from a snapshot file. The cost of loading
+# only depends on how many orders are resting in the saved book, not on how many
+# orders were processed to build it.
+#####
+def load_lob(path):
+    import snapshot
+    return snapshot.load_snapshot(path)
@@ -0,0 +1,83 @@
+import numpy as np
+import engine
+
+# BATCH #
+
+#####
+# This is the layout of a batch of orders. Each order is one record of a NumPy
+# structured array, using the same conventions as the engine: order_type is 0 for
+# a limit order and 1 for a market order, side is 1 for a buy and -1 for a sell,
+# the price is given in ticks (it is 0 for a market order since the price is not
+# applicable) and qty is the number of shares.
+#####
+ORDER_DTYPE = np.dtype([("order_id", np.int64),
+                        ("time", np.int64),
+                        ("order_type", np.int8),
+                        ("side", np.int8),
+                        ("price", np.int32),
+                        ("qty", np.int32)])
+
+#####
+# This function is designed to randomly generate a batch of n orders in one pass.
+# It follows the same rules as gen_order: an order has a 90% chance of being a
+# limit order and a 10% chance of being a market order, it is a buy or a sell with
+# equal probability, and a limit order is given a random price between $70 and $80
+# (a whole dollar amount from 70 to 79 plus a random number of cents from 0 to 100).
+# Each order is for a random number of shares between 1 and max_qty, which is 1 by
+# default so that every order is for exactly 1 share like gen_order. The orders are
+# sent in increments of 1 unit of time starting at start, and the time stamp also
+# serves as the order ID. The seed may be an integer or an existing
+# numpy.random.Generator, so the same seed always produces the same batch. This
+# function returns a structured array with the ORDER_DTYPE layout.
+#####
+def gen_orders(n, seed=None, start=1, max_qty=1):
+    rng = np.random.default_rng(seed)
+    orders = np.empty(n, dtype=ORDER_DTYPE)
+
+    orders["order_id"] = np.arange(start, start + n)
+    orders["time"] = orders["order_id"]
+    orders["order_type"] = rng.random(n) < 0.1
+    orders["side"] = np.where(rng.random(n) < 0.5, engine.BUY, engine.SELL)
+
+    price = rng.integers(70, 80, size=n) * engine.TICKS_PER_DOLLAR + rng.integers(0, 101, size=n)
+    orders["price"] = np.where(orders["order_type"] == engine.MARKET, 0, price)
+    orders["qty"] = rng.integers(1, max_qty + 1, size=n)
+
+    return orders
+
+#####
+# This is the layout of the fills produced by process_orders. Each fill records the
+# ID of the incoming order that took liquidity, the ID of the resting order it was
+# matched with, the execution price in ticks, the number of shares traded and the
+# time of the execution.
+#####
+FILL_DTYPE = np.dtype([("aggressor_id", np.int64),
+                       ("resting_id", np.int64),
+                       ("price", np.int32),
+                       ("qty", np.int32),
+                       ("time", np.int64)])
+
+#####
+# This function processes a batch of orders (a structured array with the
+# ORDER_DTYPE layout, such as the output of gen_orders) against the limit order book
+# in one call. Nothing is printed. The function returns two arrays: the fills in
+# the order they happened, with the FILL_DTYPE layout, and one engine status code
+# per order (RESTED, FILLED, PARTIAL or REJECTED). An order whose ID is already
+# resting in the book is rejected, like any other order the book cannot take, so a
+# batch is always processed as a whole. Writing into a NumPy array one element
+# at a time is slower than appending to a list, so the results are gathered in
+# lists and each output array is allocated once, at its final size.
+#####
+def process_orders(book, orders):
+    status = []
+    fills = []
+    submit_order = engine.submit_order
+
+    for order_id, time, order_type, side, price, qty in orders.tolist():
+        try:
+            status.append(submit_order(book, order_type, side, price, qty, time, order_id, fills))
+        except ValueError:
+            # the order ID is already resting in the book
+            status.append(engine.REJECTED)
+
+    return np.array(fills, dtype=FILL_DTYPE), np.array(status, dtype=np.int8)
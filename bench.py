@@ -0,0 +1,304 @@
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import time
+import numpy as np
+import pandas as pd
+import auction
+import engine
+
+# BENCHMARK #
+
+#####
+# These are the kinds of messages in a benchmark workload.
+#####
+NEW = 0
+CANCEL = 1
+
+WORKLOAD_DTYPE = np.dtype([("kind", np.int8),
+                           ("order_id", np.int64),
+                           ("order_type", np.int8),
+                           ("side", np.int8),
+                           ("price", np.int32),
+                           ("qty", np.int32)])
+
+#####
+# These functions draw limit prices (in ticks) for a workload. "uniform" is the
+# gen_order distribution ($70.00 to $80.99), "normal" clusters prices around $75
+# with a standard deviation of $1, and "narrow" spreads them evenly over $74.50 to
+# $75.50, so most orders land on a handful of busy price levels.
+#####
+PRICE_DISTRIBUTIONS = {
+    "uniform" : lambda rng, n: rng.integers(70, 80, size=n) * 100 + rng.integers(0, 101, size=n),
+    "normal" : lambda rng, n: np.clip(np.rint(rng.normal(7500, 100, size=n)), 1, None),
+    "narrow" : lambda rng, n: rng.integers(7450, 7551, size=n),
+}
+
+#####
+# This function generates a reproducible benchmark workload. The book is first
+# filled with depth resting orders (half bids below $75 and half asks above, so
+# that none of them cross). Then n messages follow: a cancel_rate share of them
+# cancel one of the last 1000 limit orders (which may have been filled already),
+# and the rest are new orders, of which a market_ratio share are market orders.
+# The function returns the prefill orders and the messages as two structured
+# arrays with the WORKLOAD_DTYPE layout.
+#####
+def gen_workload(n, depth, market_ratio, cancel_rate, price_dist, seed):
+    rng = np.random.default_rng(seed)
+
+    prefill = np.zeros(depth, dtype=WORKLOAD_DTYPE)
+    prefill["kind"] = NEW
+    prefill["order_id"] = np.arange(1, depth + 1)
+    prefill["order_type"] = engine.LIMIT
+    prefill["side"] = np.where(np.arange(depth) % 2 == 0, engine.BUY, engine.SELL)
+    prefill["price"] = np.where(prefill["side"] == engine.BUY, 7499 - rng.integers(0, 500, size=depth), 7501 + rng.integers(0, 500, size=depth))
+    prefill["qty"] = 1
+
+    messages = np.zeros(n, dtype=WORKLOAD_DTYPE)
+    messages["kind"] = np.where(rng.random(n) < cancel_rate, CANCEL, NEW)
+    messages["order_type"] = np.where(rng.random(n) < market_ratio, engine.MARKET, engine.LIMIT)
+    messages["side"] = np.where(rng.random(n) < 0.5, engine.BUY, engine.SELL)
+    messages["price"] = PRICE_DISTRIBUTIONS[price_dist](rng, n)
+    messages["qty"] = 1
+
+    # new orders get fresh IDs, while cancels point back at one of the recent limit orders
+    new = messages["kind"] == NEW
+    messages["order_id"][new] = depth + 1 + np.arange(new.sum())
+    limit_ids = np.concatenate([prefill["order_id"], messages["order_id"][new & (messages["order_type"] == engine.LIMIT)]])
+    limit_pos = np.searchsorted(limit_ids, np.maximum.accumulate(np.where(new, messages["order_id"], depth)), side="right")
+    lookback = rng.integers(1, 1001, size=n)
+
+    # a cancel that comes before any limit order was placed keeps order ID 0, which is never in the book
+    cancel = ~new & (limit_pos > 0)
+    messages["order_id"][cancel] = limit_ids[np.maximum(limit_pos[cancel] - lookback[cancel], 0)]
+
+    return prefill, messages
+
+#####
+# An engine adapter tells the benchmark how to drive one implementation of the
+# limit order book. new_book returns an empty book, prepare turns a workload
+# message into whatever the submit function takes (this is done before the clock
+# starts), and submit, cancel, spread and clear carry out one operation each.
+# auction switches a book in and out of call auction mode, which is how a crossed
+# book is built for the clear to work on. Every engine whose book can be crossed
+# keeps it in engine.py, so they all clear it with the same call auction
+# (auction.uncross), and the "clear" timings compare like with like. An adapter
+# can leave cancel as None if the implementation cannot cancel orders, and
+# auction as None if its book can never be crossed (in which case clears are not
+# timed).
+#####
+class EngineAdapter:
+    def __init__(self, new_book, prepare, submit, cancel, spread, clear, auction=None):
+        self.new_book = new_book
+        self.prepare = prepare
+        self.submit = submit
+        self.cancel = cancel
+        self.spread = spread
+        self.clear = clear
+        self.auction = auction
+
+def _engine_adapter():
+    def submit(book, message):
+        engine.submit_order(book, *message)
+
+    return EngineAdapter(engine.init_book,
+                         lambda m, t: (int(m["order_type"]), int(m["side"]), int(m["price"]), int(m["qty"]), t, int(m["order_id"])),
+                         submit,
+                         engine.cancel_order,
+                         engine.spread,
+                         auction.uncross,
+                         engine.set_auction_mode)
+
+def _ladder_adapter():
+    import ladder
+
+    def submit(book, message):
+        ladder.submit_order(book, *message)
+
+    # the workload prices stay well inside $0.01 to $150.00
+    return EngineAdapter(lambda: ladder.init_book(1, 15000),
+                         lambda m, t: (int(m["order_type"]), int(m["side"]), int(m["price"]), int(m["qty"]), t, int(m["order_id"])),
+                         submit,
+                         ladder.cancel_order,
+                         ladder.spread,
+                         ladder.clear_market)
+
+def _backend_adapter():
+    import backend
+
+    def prepare(m, t):
+        return pd.DataFrame(data={"Order ID" : [int(m["order_id"])], "Order Time" : [t],
+                                  "Order Type" : ["Market" if m["order_type"] == engine.MARKET else "Limit"],
+                                  "Order Direction" : ["Buy" if m["side"] == engine.BUY else "Sell"],
+                                  "Order Price" : [engine.to_price(int(m["price"]))], "Order Quantity" : [int(m["qty"])]})
+
+    return EngineAdapter(backend.init_lob, prepare, backend.process_order, backend.cancel_order, backend.get_spread, auction.uncross,
+                         engine.set_auction_mode)
+
+def _lob_adapter():
+    import Limit_Order_Book
+
+    def prepare(m, t):
+        return pd.DataFrame(data={"order_id" : [int(m["order_id"])], "order_time_stamp" : [t],
+                                  "order_m_flag" : [int(m["order_type"])], "order_trading_direction" : [int(m["side"])],
+                                  "order_price" : [engine.to_price(int(m["price"]))], "order_quantity" : [int(m["qty"])]})
+
+    return EngineAdapter(Limit_Order_Book.init_lob, prepare, Limit_Order_Book.process_order, None, Limit_Order_Book.get_spread, auction.uncross,
+                         engine.set_auction_mode)
+
+#####
+# These are the engines the benchmark knows about. "engine" and "ladder" drive
+# engine.py and the array ladder of ladder.py directly, while "backend" and "lob"
+# go through the process_order functions of backend.py and Limit_Order_Book.py,
+# one data frame per order. A new engine is added to the comparison by adding a
+# function that returns its adapter here.
+#####
+ENGINES = {
+    "engine" : _engine_adapter,
+    "ladder" : _ladder_adapter,
+    "backend" : _backend_adapter,
+    "lob" : _lob_adapter,
+}
+
+#####
+# This function summarizes the latencies (in nanoseconds) recorded for one kind of
+# operation.
+#####
+def summarize(latencies):
+    latencies = np.asarray(latencies, dtype=np.int64)
+
+    if len(latencies) == 0:
+        return {"count" : 0}
+
+    total = latencies.sum()
+    return {"count" : int(len(latencies)),
+            "ops_per_sec" : float(len(latencies) / (total / 1e9)) if total else None,
+            "p50_ns" : float(np.percentile(latencies, 50)),
+            "p99_ns" : float(np.percentile(latencies, 99)),
+            "p99.9_ns" : float(np.percentile(latencies, 99.9)),
+            "max_ns" : int(latencies.max())}
+
+#####
+# This function runs one workload against one engine. The book is filled with the
+# prefill orders first (untimed), and then every message is timed on its own,
+# followed by a timed bid-ask spread read. A book that matches orders as they
+# arrive is never crossed, so the market clearing is timed separately: clears
+# times, the prefill and the first cross_orders limit orders of the workload are
+# placed in a new book in auction mode (untimed), so that they overlap, and the
+# crossed book is then cleared. The process_order functions of some engines print
+# a line for every rejected market order, so anything printed is thrown away. The
+# function returns the latency summary for each kind of operation along with the
+# overall message throughput.
+#####
+def run_workload(adapter, prefill, messages, clears=100, cross_orders=1000):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return _run_workload(adapter, prefill, messages, clears, cross_orders)
+
+def _run_workload(adapter, prefill, messages, clears, cross_orders):
+    book = adapter.new_book()
+    timer = time.perf_counter_ns
+
+    for t, m in enumerate(prefill):
+        adapter.submit(book, adapter.prepare(m, t))
+
+    prepared = [adapter.prepare(m, len(prefill) + t) if m["kind"] == NEW else int(m["order_id"]) for t, m in enumerate(messages)]
+    kinds = ["market" if m["kind"] == NEW and m["order_type"] == engine.MARKET else "limit" if m["kind"] == NEW else "cancel" for m in messages]
+    latencies = {"limit" : [], "market" : [], "cancel" : [], "spread" : [], "clear" : []}
+
+    start = timer()
+
+    for kind, message in zip(kinds, prepared):
+        if kind == "cancel":
+            if adapter.cancel is None:
+                continue
+
+            t0 = timer()
+            adapter.cancel(book, message)
+            latencies["cancel"].append(timer() - t0)
+        else:
+            t0 = timer()
+            adapter.submit(book, message)
+            latencies[kind].append(timer() - t0)
+
+        t0 = timer()
+        adapter.spread(book)
+        latencies["spread"].append(timer() - t0)
+
+    elapsed = timer() - start
+
+    if adapter.auction is not None:
+        crossing = [message for kind, message in zip(kinds, prepared) if kind == "limit"][:cross_orders]
+
+        for _ in range(clears):
+            book = adapter.new_book()
+            adapter.auction(book, True)
+
+            for t, m in enumerate(prefill):
+                adapter.submit(book, adapter.prepare(m, t))
+
+            for message in crossing:
+                adapter.submit(book, message)
+
+            adapter.auction(book, False)
+
+            t0 = timer()
+            adapter.clear(book)
+            latencies["clear"].append(timer() - t0)
+
+    processed = len(latencies["limit"]) + len(latencies["market"]) + len(latencies["cancel"])
+    return {"messages_per_sec" : processed / (elapsed / 1e9),
+            "operations" : {kind : summarize(values) for kind, values in latencies.items()}}
+
+#####
+# This function runs every combination of engine, book depth, market order ratio,
+# cancel rate and price distribution. Every engine sees exactly the same workload
+# for a given combination. The function returns a list with one result per run.
+#####
+def run_suite(engines, n, depths, market_ratios, cancel_rates, price_dists, seed, clears=100):
+    adapters = {name : ENGINES[name]() for name in engines}
+    results = []
+
+    for depth, market_ratio, cancel_rate, price_dist in itertools.product(depths, market_ratios, cancel_rates, price_dists):
+        prefill, messages = gen_workload(n, depth, market_ratio, cancel_rate, price_dist, seed)
+
+        for name, adapter in adapters.items():
+            result = run_workload(adapter, prefill, messages, clears)
+            result.update({"engine" : name, "orders" : n, "depth" : depth, "market_ratio" : market_ratio,
+                           "cancel_rate" : cancel_rate, "price_dist" : price_dist, "seed" : seed, "clears" : clears})
+            results.append(result)
+            print("{:8s} depth={:<7d} market={:<5} cancel={:<5} prices={:8s} {:>12,.0f} msg/s  limit p50={:>8,.0f}ns p99={:>9,.0f}ns".format(
+                name, depth, market_ratio, cancel_rate, price_dist, result["messages_per_sec"],
+                result["operations"]["limit"].get("p50_ns", 0), result["operations"]["limit"].get("p99_ns", 0)))
+
+    return results
+
+#####
+# The benchmark is run from the command line, for example:
+#
+#     python bench.py --engines engine backend --depths 100 10000 --output results.json
+#
+# The results are written as JSON along with the settings and the machine they
+# were recorded on, so that runs can be compared to spot regressions.
+#####
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the limit order book engines.")
+    parser.add_argument("--engines", nargs="+", default=["engine", "backend", "lob"], choices=sorted(ENGINES))
+    parser.add_argument("--orders", type=int, default=5000, help="number of messages per run")
+    parser.add_argument("--depths", nargs="+", type=int, default=[100, 10000], help="resting orders before the run starts")
+    parser.add_argument("--market-ratios", nargs="+", type=float, default=[0.1, 0.3])
+    parser.add_argument("--cancel-rates", nargs="+", type=float, default=[0.0, 0.5])
+    parser.add_argument("--prices", nargs="+", default=["uniform", "normal"], choices=sorted(PRICE_DISTRIBUTIONS))
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--clears", type=int, default=100, help="number of crossed books to time the market clearing on")
+    parser.add_argument("--output", help="path of the JSON file to write the results to")
+    args = parser.parse_args()
+
+    results = run_suite(args.engines, args.orders, args.depths, args.market_ratios, args.cancel_rates, args.prices, args.seed, args.clears)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python" : platform.python_version(), "machine" : platform.machine(),
+                       "numpy" : np.__version__, "pandas" : pd.__version__, "results" : results}, f, indent=2)
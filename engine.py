@@ -0,0 +1,709 @@
+from bisect import bisect_left
+
+# ENGINE #
+
+#####
+# These constants describe an order. The direction values follow the
+# order_trading_direction convention used in Limit_Order_Book.py (1 = buy,
+# -1 = sell) and the type values follow its order_m_flag convention (0 = limit,
+# 1 = market).
+#####
+BUY = 1
+SELL = -1
+
+LIMIT = 0
+MARKET = 1
+
+#####
+# These are the status codes returned by the engine. An order is RESTED when it
+# is added to the book, FILLED when it is matched against a resting order and
+# REJECTED when it is a market order that arrives while the opposite side is empty.
+# An order is PARTIAL when only some of its shares are matched, in which case the
+# rest of a limit order is added to the book and the rest of a market order is
+# dropped. A cancel returns CANCELLED, and NOT_FOUND when the order ID is not
+# resting in the book.
+#####
+RESTED = 0
+FILLED = 1
+REJECTED = 2
+CANCELLED = 3
+NOT_FOUND = 4
+PARTIAL = 5
+
+#####
+# Prices are stored in the engine as an integer number of ticks (cents) so that
+# two orders with the same price always land on the same price level, no matter
+# how the floating point price was computed.
+#####
+TICKS_PER_DOLLAR = 100
+
+#####
+# This is the number of price levels on each side that are kept in the L2 depth
+# cache, unless more levels are asked for.
+#####
+DEPTH_LEVELS = 10
+
+def to_ticks(price):
+    return int(round(price * TICKS_PER_DOLLAR))
+
+def to_price(ticks):
+    return ticks / TICKS_PER_DOLLAR
+
+#####
+# A resting order in the limit order book. An order has an ID, a side, a price,
+# the number of shares that are still open and the time stamp it was placed at.
+# The prev/next/level fields link the order into the queue of its price level so
+# that it can be unlinked in constant time when it is cancelled.
+#####
+class Order:
+    __slots__ = ("order_id", "side", "price", "qty", "time", "prev", "next", "level")
+
+    def __init__(self, order_id, side, price, qty, time):
+        self.order_id = order_id
+        self.side = side
+        self.price = price
+        self.qty = qty
+        self.time = time
+        self.prev = None
+        self.next = None
+        self.level = None
+
+#####
+# A price level holds every resting order at one price in a FIFO queue, kept as a
+# doubly linked list running from head to tail. Orders are appended at the tail
+# as they arrive, so the order at the head is always the one with time priority.
+# The level also keeps the number of orders in the queue and the total number of
+# shares they leave open.
+#####
+class PriceLevel:
+    __slots__ = ("price", "head", "tail", "count", "volume")
+
+    def __init__(self, price):
+        self.price = price
+        self.head = None
+        self.tail = None
+        self.count = 0
+        self.volume = 0
+
+#####
+# One side of the limit order book. The levels are kept in a dictionary keyed by
+# price, and the keys list holds the occupied prices in sorted order. The keys are
+# multiplied by the direction of the side (price for bids, -price for asks) so
+# that the best price is always the LAST entry of the list on both sides. This
+# lets us read and remove the best level in constant time, while a new level is
+# located with a binary search. When a level below the best price empties out,
+# its key is left in the list as a stale entry instead of being deleted from the
+# middle of the list. Stale keys are reused if the price is quoted again, skipped
+# when the book is walked, and dropped once they reach the end of the list.
+#
+# Each side also caches its L2 depth: a list of (price, shares, orders) tuples for
+# the top depth_n levels. Every change to the side goes through _touch, which
+# counts the change in version and throws the cache away only if the change
+# happened at a price that is inside the cached levels. A change deeper in the
+# book leaves the cache untouched, so reading the depth is usually a lookup.
+#####
+class BookSide:
+    __slots__ = ("side", "levels", "keys", "version", "depth", "depth_n", "depth_floor")
+
+    def __init__(self, side):
+        self.side = side
+        self.levels = {}
+        self.keys = []
+        self.version = 0
+        self.depth = None
+        self.depth_n = DEPTH_LEVELS
+        self.depth_floor = 0
+
+#####
+# The limit order book itself, made up of the bid side and the ask side. The
+# orders dictionary indexes every resting order by its ID, and next_id is the
+# lowest ID that has not been used in this book yet. If a journal is attached to
+# the book (see journal.py), every order, cancel, replace and fill is recorded in
+# it, and if metrics are attached (see metrics.py), every order, cancel and
+# replace is timed and counted. If a feed is attached (see feed.py), every change
+# to the book is published on it. While auction is set, the book is collecting
+# orders for a call auction (see auction.py) instead of matching them as they
+# arrive.
+#####
+class Book:
+    __slots__ = ("bids", "asks", "orders", "next_id", "journal", "metrics", "feed", "auction")
+
+    def __init__(self):
+        self.bids = BookSide(BUY)
+        self.asks = BookSide(SELL)
+        self.orders = {}
+        self.next_id = 1
+        self.journal = None
+        self.metrics = None
+        self.feed = None
+        self.auction = False
+
+#####
+# This function is designed to initialize an empty limit order book. Unlike the
+# data frame version, the book has no fixed number of rows and grows with the
+# number of resting orders.
+#####
+def init_book():
+    return Book()
+
+#####
+# This function returns the best price (in ticks) on one side of the book, or
+# None if that side is empty.
+#####
+def best_price(book_side):
+    if book_side.keys:
+        return book_side.side * book_side.keys[-1]
+    return None
+
+def best_bid(book):
+    return best_price(book.bids)
+
+def best_ask(book):
+    return best_price(book.asks)
+
+#####
+# These functions return the bid-ask spread and the midpoint of the best bid and
+# the best ask (both in ticks), or None if either side of the book is empty.
+#####
+def spread(book):
+    if book.bids.keys and book.asks.keys:
+        return -book.asks.keys[-1] - book.bids.keys[-1]
+    return None
+
+def mid_price(book):
+    if book.bids.keys and book.asks.keys:
+        return (book.bids.keys[-1] - book.asks.keys[-1]) / 2
+    return None
+
+#####
+# This function returns a number that goes up every time the book changes, which
+# lets callers tell whether anything they computed from the book is out of date.
+#####
+def book_version(book):
+    return book.bids.version + book.asks.version
+
+#####
+# This function records a change to one side of the book at the given price and
+# drops the cached depth of that side if the change can show up in it. The cache
+# only covers prices at or better than depth_floor, and when the side has fewer
+# levels than the cache holds, depth_floor is set so that every change counts.
+#####
+def _touch(book_side, price):
+    book_side.version += 1
+
+    if book_side.depth is not None and book_side.side * price >= book_side.depth_floor:
+        book_side.depth = None
+
+#####
+# This function returns the L2 depth for the top n price levels of one side of the
+# book as a list of (price in ticks, shares, number of orders) tuples, starting with
+# the best price. The levels are only walked again if the cache was dropped since
+# the last call or more levels are asked for than the cache holds.
+#####
+def get_depth(book_side, n=DEPTH_LEVELS):
+    if book_side.depth is None or n > book_side.depth_n:
+        depth_n = max(n, DEPTH_LEVELS)
+        depth = []
+
+        for key in reversed(book_side.keys):
+            level = book_side.levels.get(book_side.side * key)
+
+            if level is not None:
+                depth.append((level.price, level.volume, level.count))
+
+                if len(depth) == depth_n:
+                    break
+
+        book_side.depth = depth
+        book_side.depth_n = depth_n
+
+        if len(depth) == depth_n:
+            book_side.depth_floor = book_side.side * depth[-1][0]
+        else:
+            book_side.depth_floor = float("-inf")
+
+    return book_side.depth[:n]
+
+#####
+# This function returns a fresh order ID for an order that was not assigned one
+# before it reached the book.
+#####
+def next_order_id(book):
+    order_id = book.next_id
+    book.next_id += 1
+    return order_id
+
+#####
+# This function adds an order to the back of the queue at its price level,
+# creating the level if no order is resting at that price yet.
+#####
+def _add_order(book_side, order):
+    level = book_side.levels.get(order.price)
+
+    if level is None:
+        level = PriceLevel(order.price)
+        book_side.levels[order.price] = level
+
+        key = book_side.side * order.price
+        keys = book_side.keys
+        i = bisect_left(keys, key)
+
+        # a stale key for this price may still be in the list, in which case we reuse it
+        if i == len(keys) or keys[i] != key:
+            keys.insert(i, key)
+
+    order.level = level
+    order.prev = level.tail
+
+    if level.tail is None:
+        level.head = order
+    else:
+        level.tail.next = order
+
+    level.tail = order
+    level.count += 1
+    level.volume += order.qty
+    _touch(book_side, order.price)
+
+#####
+# This function discards a price level once its queue is empty. If it was the
+# best level, its key and any stale keys behind it are popped off the end of the
+# list. Otherwise the key is left behind as a stale entry, and the list is
+# compacted once stale keys make up more than half of it.
+#####
+def _drop_level(book_side, level):
+    del book_side.levels[level.price]
+    keys = book_side.keys
+    levels = book_side.levels
+    side = book_side.side
+
+    if keys[-1] == side * level.price:
+        keys.pop()
+
+        while keys and side * keys[-1] not in levels:
+            keys.pop()
+    elif len(keys) > 2 * len(levels):
+        keys[:] = [key for key in keys if side * key in levels]
+
+#####
+# This function unlinks an order from the queue of its price level.
+#####
+def _unlink(book_side, order):
+    level = order.level
+
+    if order.prev is None:
+        level.head = order.next
+    else:
+        order.prev.next = order.next
+
+    if order.next is None:
+        level.tail = order.prev
+    else:
+        order.next.prev = order.prev
+
+    order.prev = None
+    order.next = None
+    order.level = None
+    level.count -= 1
+    level.volume -= order.qty
+    _touch(book_side, level.price)
+
+    if level.count == 0:
+        _drop_level(book_side, level)
+
+#####
+# This function matches an incoming order against the opposite side of the book.
+# It walks the price levels from the best price, filling the order at the head of
+# each queue until the incoming order has no shares left, the opposite side is
+# empty, or (for a limit order) the next price no longer crosses the limit price.
+# A resting order that is only partly filled keeps its place in the queue. The
+# function returns the number of shares that could not be matched.
+#####
+def _match(book, opposite, side, order_type, price, qty, time, order_id, fills):
+    keys = opposite.keys
+    levels = opposite.levels
+    opposite_side = opposite.side
+
+    while qty and keys:
+        best = opposite_side * keys[-1]
+
+        if order_type == LIMIT and side * price < side * best:
+            break
+
+        level = levels[best]
+
+        while qty and level.count:
+            resting = level.head
+            traded = resting.qty if resting.qty < qty else qty
+            qty -= traded
+
+            if fills is not None:
+                fills.append((order_id, resting.order_id, best, traded, time))
+
+            if traded == resting.qty:
+                # the resting order is used up, which also drops the level once its queue is empty
+                _unlink(opposite, resting)
+                del book.orders[resting.order_id]
+            else:
+                resting.qty -= traded
+                level.volume -= traded
+                _touch(opposite, best)
+
+    return qty
+
+#####
+# This function carries out an order once it has an ID. It matches the order with
+# the opposite side of the book and adds whatever is left of a limit order to the
+# book, returning one of the status codes above.
+#####
+def _execute(book, order_type, side, price, qty, time, order_id, fills):
+    if side == BUY:
+        opposite = book.asks
+        same = book.bids
+    else:
+        opposite = book.bids
+        same = book.asks
+
+    # a market order can only be executed if there is a resting order to match
+    if order_type == MARKET and not opposite.keys:
+        return REJECTED
+
+    # during a call auction there is no matching, so market orders are dropped and limit orders all rest
+    if book.auction:
+        if order_type == MARKET:
+            return REJECTED
+
+        order = Order(order_id, side, price, qty, time)
+        _add_order(same, order)
+        book.orders[order_id] = order
+        return RESTED
+
+    remaining = _match(book, opposite, side, order_type, price, qty, time, order_id, fills)
+
+    if remaining == 0:
+        return FILLED
+
+    if order_type == MARKET:
+        return PARTIAL
+
+    order = Order(order_id, side, price, remaining, time)
+    _add_order(same, order)
+    book.orders[order_id] = order
+    return RESTED if remaining == qty else PARTIAL
+
+#####
+# This function removes a resting order from the book.
+#####
+def _remove(book, order):
+    del book.orders[order.order_id]
+    _unlink(book.bids if order.side == BUY else book.asks, order)
+
+#####
+# This function processes an order against the limit order book and returns one
+# of the status codes above. A market order is matched with the best orders on the
+# opposite side, sweeping through as many price levels as it takes to fill it, and
+# whatever cannot be filled is dropped. A limit order is matched the same way but
+# only at prices that cross its limit price, and the rest of it is added to the
+# book behind every order already resting at the same price. The price of a limit
+# order is given in ticks and is ignored for a market order. If no order ID is
+# given, the next free ID of the book is assigned to the order. If a fills list is
+# given, every execution is appended to it as an (aggressor ID, resting ID, price,
+# shares, time) tuple, where the price is the price of the resting order. An order
+# for no shares (or fewer) is rejected without being given an ID.
+#####
+def submit_order(book, order_type, side, price, qty, time, order_id=None, fills=None):
+    if qty <= 0:
+        return REJECTED
+
+    if order_id is None:
+        order_id = next_order_id(book)
+    elif order_id in book.orders:
+        raise ValueError("order ID " + str(order_id) + " is already resting in the book")
+    elif order_id >= book.next_id:
+        book.next_id = order_id + 1
+
+    journal = book.journal
+    metrics = book.metrics
+
+    if journal is None and metrics is None and book.feed is None:
+        return _execute(book, order_type, side, price, qty, time, order_id, fills)
+
+    # the fills are needed for the journal, the metrics and the feed even if the caller did not ask for them
+    if fills is None:
+        fills = []
+
+    first = len(fills)
+
+    if journal is not None:
+        journal.record_order(order_type, side, price, qty, order_id, time)
+
+    if metrics is None:
+        status = _execute(book, order_type, side, price, qty, time, order_id, fills)
+    else:
+        start = metrics.clock()
+        status = _execute(book, order_type, side, price, qty, time, order_id, fills)
+        metrics.record_submit(order_type, status, fills, first, metrics.clock() - start)
+
+    if journal is not None:
+        journal.record_fills(fills, first)
+
+    if book.feed is not None:
+        book.feed.record_execution(book, order_id, side, fills, first, time)
+
+    return status
+
+#####
+# This function puts an order back in the book as a resting order without matching
+# it, behind the orders already resting at its price. It is used to restore a book
+# that was saved, where the orders are known not to cross.
+#####
+def restore_order(book, order_id, side, price, qty, time):
+    order = Order(order_id, side, price, qty, time)
+    _add_order(book.bids if side == BUY else book.asks, order)
+    book.orders[order_id] = order
+
+    if order_id >= book.next_id:
+        book.next_id = order_id + 1
+
+    if book.feed is not None:
+        book.feed.record_add(book, order)
+
+#####
+# This function cancels a resting order given its ID. The order is found through
+# the ID index and unlinked from its price level, so the cost of a cancel does not
+# depend on how many orders are resting in the book.
+#####
+def cancel_order(book, order_id):
+    if book.metrics is not None:
+        start = book.metrics.clock()
+        status = _cancel(book, order_id)
+        book.metrics.record_cancel(status, book.metrics.clock() - start)
+        return status
+
+    return _cancel(book, order_id)
+
+def _cancel(book, order_id):
+    order = book.orders.get(order_id)
+
+    if order is None:
+        return NOT_FOUND
+
+    if book.journal is not None:
+        book.journal.record_cancel(order_id)
+
+    _remove(book, order)
+
+    if book.feed is not None:
+        book.feed.record_delete(book, order, 0)
+
+    return CANCELLED
+
+#####
+# This function replaces the price and/or the number of shares of a resting order
+# (passing None keeps the current value). An order replaced with no shares is
+# cancelled and CANCELLED is returned. If the price is unchanged and the order
+# is only reduced, it is amended in place and keeps its time priority, and RESTED
+# is returned. Otherwise the order keeps its ID but loses its time priority, so it
+# is cancelled and submitted again as a limit order with the new price and time
+# stamp, and the status of the resubmitted order is returned.
+#####
+def replace_order(book, order_id, price, qty, time, fills=None):
+    metrics = book.metrics
+
+    if metrics is None:
+        return _replace(book, order_id, price, qty, time, fills)
+
+    if fills is None:
+        fills = []
+
+    first = len(fills)
+    start = metrics.clock()
+    status = _replace(book, order_id, price, qty, time, fills)
+    metrics.record_replace(status, fills, first, metrics.clock() - start)
+    return status
+
+def _replace(book, order_id, price, qty, time, fills):
+    order = book.orders.get(order_id)
+
+    if order is None:
+        return NOT_FOUND
+
+    if price is None:
+        price = order.price
+
+    if qty is None:
+        qty = order.qty
+
+    journal = book.journal
+
+    if journal is not None:
+        journal.record_replace(order_id, price, qty, time)
+
+    feed = book.feed
+
+    # an order replaced with no shares is cancelled, whatever its new price
+    if qty <= 0:
+        _remove(book, order)
+
+        if feed is not None:
+            feed.record_delete(book, order, time)
+
+        return CANCELLED
+
+    if price == order.price and qty <= order.qty:
+        order.level.volume -= order.qty - qty
+        order.qty = qty
+        _touch(book.bids if order.side == BUY else book.asks, order.price)
+
+        if feed is not None:
+            feed.record_modify(book, order, time)
+
+        return RESTED
+
+    _remove(book, order)
+
+    if journal is None and feed is None:
+        return _execute(book, LIMIT, order.side, price, qty, time, order_id, fills)
+
+    if fills is None:
+        fills = []
+
+    first = len(fills)
+
+    if feed is not None:
+        feed.record_delete(book, order, time, end=False)
+
+    status = _execute(book, LIMIT, order.side, price, qty, time, order_id, fills)
+
+    if journal is not None:
+        journal.record_fills(fills, first)
+
+    if feed is not None:
+        feed.record_execution(book, order_id, order.side, fills, first, time)
+
+    return status
+
+#####
+# This function switches a book in and out of call auction mode. While the book is
+# in auction mode, limit orders are added to the book without being matched, even
+# if they cross the other side, and market orders are rejected. The crossed book
+# is then uncrossed all at once by auction.uncross.
+#####
+def set_auction_mode(book, on):
+    if book.journal is not None:
+        book.journal.record_auction_mode(on)
+
+    book.auction = on
+
+#####
+# This function removes qty shares from one side of the book in priority order,
+# starting with the best price, and returns the (order ID, shares, price) that were
+# taken from each order. Price levels that are used up entirely are dropped as a whole
+# rather than one order at a time, and only the last order touched can be left
+# with shares open. The caller has to make sure that the side holds at least qty
+# shares.
+#####
+def take_volume(book, book_side, qty):
+    taken = []
+    orders = book.orders
+    keys = book_side.keys
+    levels = book_side.levels
+    side = book_side.side
+
+    while qty:
+        price = side * keys[-1]
+        level = levels[price]
+
+        if level.volume <= qty:
+            # the whole level is used up
+            qty -= level.volume
+            order = level.head
+
+            while order is not None:
+                taken.append((order.order_id, order.qty, price))
+                del orders[order.order_id]
+                order = order.next
+
+            level.head = None
+            level.tail = None
+            level.count = 0
+            level.volume = 0
+            _touch(book_side, price)
+            _drop_level(book_side, level)
+        else:
+            # part of the level is used up, starting at the front of the queue
+            while qty:
+                order = level.head
+
+                if order.qty <= qty:
+                    taken.append((order.order_id, order.qty, price))
+                    qty -= order.qty
+                    del orders[order.order_id]
+                    _unlink(book_side, order)
+                else:
+                    taken.append((order.order_id, qty, price))
+                    order.qty -= qty
+                    level.volume -= qty
+                    _touch(book_side, price)
+                    qty = 0
+
+    return taken
+
+#####
+# This function yields the resting orders on one side of the book in priority
+# order, starting with the best price.
+#####
+def iter_orders(book_side):
+    for key in reversed(book_side.keys):
+        level = book_side.levels.get(book_side.side * key)
+
+        # stale keys have no level behind them
+        if level is None:
+            continue
+
+        order = level.head
+
+        while order is not None:
+            yield order
+            order = order.next
+
+#####
+# This function clears the market by matching the top bid with the top ask for as
+# long as the two sides overlap. Each match trades as many shares as both orders
+# have open. The equilibrium price is the midpoint of the last pair of orders that
+# was matched, and it is returned in dollars. If the two sides do not overlap, None
+# is returned and the book is left unmodified.
+#####
+def clear_market(book):
+    bid = best_bid(book)
+    ask = best_ask(book)
+
+    if bid is None or ask is None or bid < ask:
+        return None
+
+    if book.journal is not None:
+        book.journal.record_clear()
+
+    while bid is not None and ask is not None and bid >= ask:
+        buyer = book.bids.levels[bid].head
+        seller = book.asks.levels[ask].head
+        traded = min(buyer.qty, seller.qty)
+
+        for book_side, order in ((book.bids, buyer), (book.asks, seller)):
+            if order.qty == traded:
+                _unlink(book_side, order)
+                del book.orders[order.order_id]
+            else:
+                order.qty -= traded
+                order.level.volume -= traded
+                _touch(book_side, order.price)
+
+        if book.feed is not None:
+            book.feed.record_cross(book, buyer.order_id, seller.order_id, bid, ask, traded)
+
+        last_bid = bid
+        last_ask = ask
+        bid = best_bid(book)
+        ask = best_ask(book)
+
+    return to_price((last_bid + last_ask) / 2)
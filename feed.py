@@ -0,0 +1,269 @@
+from collections import deque, namedtuple
+import engine
+
+# MARKET DATA FEED #
+
+#####
+# These are the kinds of feed messages. Every change to the book is published as
+# one or more of them, each with the next sequence number:
+#
+#   ADD      an order came to rest in the book
+#   MODIFY   a resting order has a new number of open shares (partly filled or reduced)
+#   DELETE   a resting order left the book (cancelled, filled or replaced)
+#   TRADE    an execution between two orders
+#
+# A message is a (seq, kind, side, price, qty, level_qty, order_id, other_id, time)
+# tuple. For ADD and MODIFY, qty is the number of shares the order has open, and
+# for DELETE it is 0. level_qty is the number of shares resting at the price on
+# that side once the change is made, so a consumer that only cares about price
+# levels (L2) can keep its copy up to date from level_qty alone, while a consumer
+# that tracks every order (L3) uses order_id and qty. A TRADE is reported with the
+# incoming order as order_id and the resting order as other_id (the buyer and the
+# seller for a market clearing or an auction, where a pair cleared by
+# engine.clear_market is reported at the price of the ask), with side being the
+# side of order_id and level_qty being 0. The time of a cancel is not known to the
+# engine and is given as 0.
+#####
+ADD = 0
+MODIFY = 1
+DELETE = 2
+TRADE = 3
+
+FEED_DTYPE = [("seq", "i8"),
+              ("kind", "i1"),
+              ("side", "i1"),
+              ("price", "i4"),
+              ("qty", "i4"),
+              ("level_qty", "i8"),
+              ("order_id", "i8"),
+              ("other_id", "i8"),
+              ("time", "i8")]
+
+#####
+# A snapshot is the full book as of sequence number seq, given as (order ID, side,
+# price, shares, time) tuples for every resting order, bids first and then asks,
+# each in priority order.
+#####
+Snapshot = namedtuple("Snapshot", ["seq", "orders"])
+
+def take_snapshot(book, seq):
+    orders = [(order.order_id, order.side, order.price, order.qty, order.time)
+              for book_side in (book.bids, book.asks) for order in engine.iter_orders(book_side)]
+    return Snapshot(seq, orders)
+
+def _level_qty(book_side, price):
+    level = book_side.levels.get(price)
+    return 0 if level is None else level.volume
+
+#####
+# A feed publishes the changes of one book. Once it is attached to a book (see
+# attach_feed), the engine reports every change to it, and every message is
+# handed to each subscriber as it is published. The last history messages are
+# kept so that a consumer that missed some can catch up, and a snapshot of the book
+# is taken after every snapshot_interval messages for consumers that fell too far
+# behind (or just joined).
+#####
+class Feed:
+    __slots__ = ("seq", "history", "subscribers", "snapshot_interval", "snapshot")
+
+    def __init__(self, book, history=100000, snapshot_interval=10000):
+        self.seq = 0
+        self.history = deque(maxlen=max(history, snapshot_interval))
+        self.subscribers = []
+        self.snapshot_interval = snapshot_interval
+        self.snapshot = take_snapshot(book, 0)
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def _publish(self, kind, side, price, qty, level_qty, order_id, other_id, time):
+        self.seq += 1
+        message = (self.seq, kind, side, price, qty, level_qty, order_id, other_id, time)
+        self.history.append(message)
+
+        for callback in self.subscribers:
+            callback(message)
+
+    # the periodic snapshot is only taken between two changes, when the book matches the sequence number
+    def _end_change(self, book):
+        if self.seq - self.snapshot.seq >= self.snapshot_interval:
+            self.snapshot = take_snapshot(book, self.seq)
+
+    def _publish_fill(self, book, book_side, order_id, price, time):
+        order = book.orders.get(order_id)
+
+        if order is None:
+            self._publish(DELETE, book_side.side, price, 0, _level_qty(book_side, price), order_id, 0, time)
+        else:
+            self._publish(MODIFY, book_side.side, price, order.qty, _level_qty(book_side, price), order_id, 0, time)
+
+    #####
+    # The engine calls this method once an order has been executed, with the fills
+    # it made from position first onwards. Each fill is published as a trade
+    # followed by the change to the resting order, and whatever is left of the
+    # order itself is published as an ADD if it came to rest.
+    #####
+    def record_execution(self, book, order_id, side, fills, first, time):
+        opposite = book.asks if side == engine.BUY else book.bids
+
+        for aggressor_id, resting_id, price, qty, fill_time in fills[first:]:
+            self._publish(TRADE, side, price, qty, 0, aggressor_id, resting_id, fill_time)
+            self._publish_fill(book, opposite, resting_id, price, fill_time)
+
+        order = book.orders.get(order_id)
+
+        if order is not None:
+            book_side = book.bids if order.side == engine.BUY else book.asks
+            self._publish(ADD, order.side, order.price, order.qty, _level_qty(book_side, order.price), order_id, 0, time)
+
+        self._end_change(book)
+
+    def record_add(self, book, order):
+        book_side = book.bids if order.side == engine.BUY else book.asks
+        self._publish(ADD, order.side, order.price, order.qty, _level_qty(book_side, order.price), order.order_id, 0, order.time)
+        self._end_change(book)
+
+    def record_modify(self, book, order, time):
+        book_side = book.bids if order.side == engine.BUY else book.asks
+        self._publish(MODIFY, order.side, order.price, order.qty, _level_qty(book_side, order.price), order.order_id, 0, time)
+        self._end_change(book)
+
+    # the order has already been taken out of the book, but is not part of a bigger change yet
+    def record_delete(self, book, order, time, end=True):
+        book_side = book.bids if order.side == engine.BUY else book.asks
+        self._publish(DELETE, order.side, order.price, 0, _level_qty(book_side, order.price), order.order_id, 0, time)
+
+        if end:
+            self._end_change(book)
+
+    #####
+    # The engine calls this method for every pair of orders matched while the
+    # market is cleared, and auction.py calls record_uncross once an auction has
+    # taken its volume off the book (bought and sold hold the (order ID, shares,
+    # price) of every order that traded on each side).
+    #####
+    def record_cross(self, book, buyer_id, seller_id, bid, ask, qty):
+        self._publish(TRADE, engine.BUY, ask, qty, 0, buyer_id, seller_id, 0)
+        self._publish_fill(book, book.bids, buyer_id, bid, 0)
+        self._publish_fill(book, book.asks, seller_id, ask, 0)
+        self._end_change(book)
+
+    def record_uncross(self, book, fills, bought, sold):
+        for buyer_id, seller_id, price, qty, time in fills:
+            self._publish(TRADE, engine.BUY, price, qty, 0, buyer_id, seller_id, time)
+
+        time = fills[-1][4] if len(fills) else 0
+
+        for book_side, taken in ((book.bids, bought), (book.asks, sold)):
+            for order_id, _, price in taken:
+                self._publish_fill(book, book_side, order_id, price, time)
+
+        self._end_change(book)
+
+    #####
+    # This method helps a consumer that has applied every message up to sequence
+    # number seq to catch up. It returns a snapshot to start from (None if the
+    # consumer can keep its own copy) and the messages to apply after it. If the
+    # missed messages are no longer kept, the consumer starts again from the
+    # periodic snapshot, or from a new snapshot if even that is too old.
+    #####
+    def recover(self, book, seq):
+        oldest = self.history[0][0] if self.history else self.seq + 1
+
+        if seq >= oldest - 1:
+            return None, [message for message in self.history if message[0] > seq]
+
+        if self.snapshot.seq >= oldest - 1:
+            return self.snapshot, [message for message in self.history if message[0] > self.snapshot.seq]
+
+        self.snapshot = take_snapshot(book, self.seq)
+        return self.snapshot, []
+
+#####
+# This function attaches a new feed to a book and returns it.
+#####
+def attach_feed(book, history=100000, snapshot_interval=10000):
+    book.feed = Feed(book, history, snapshot_interval)
+    return book.feed
+
+def detach_feed(book):
+    book.feed = None
+
+#####
+# This function turns a list of feed messages into an array with the FEED_DTYPE
+# layout, for example to store or send a batch of them. The layout is given as a
+# list of fields rather than a NumPy dtype so that the feed can be used without
+# loading NumPy.
+#####
+def to_array(messages):
+    import numpy as np
+    return np.array(messages, dtype=FEED_DTYPE)
+
+#####
+# A copy of a book kept up to date from the feed, as a consumer would keep it. It
+# tracks every resting order (L3) along with the shares resting at each price on
+# each side (L2). apply returns False, without applying the message, when a
+# message is missing before it, in which case the copy should be brought up to
+# date with catch_up.
+#####
+class BookCopy:
+    __slots__ = ("seq", "orders", "levels")
+
+    def __init__(self):
+        self.seq = 0
+        self.orders = {}
+        self.levels = {engine.BUY : {}, engine.SELL : {}}
+
+    def load(self, snapshot):
+        self.seq = snapshot.seq
+        self.orders = {}
+        self.levels = {engine.BUY : {}, engine.SELL : {}}
+
+        for order_id, side, price, qty, _ in snapshot.orders:
+            self.orders[order_id] = (side, price, qty)
+            levels = self.levels[side]
+            levels[price] = levels.get(price, 0) + qty
+
+    def apply(self, message):
+        seq, kind, side, price, qty, level_qty, order_id, _, _ = message
+
+        if seq <= self.seq:
+            # already applied
+            return True
+
+        if seq != self.seq + 1:
+            return False
+
+        self.seq = seq
+
+        if kind == TRADE:
+            return True
+
+        if kind == DELETE:
+            del self.orders[order_id]
+        else:
+            self.orders[order_id] = (side, price, qty)
+
+        if level_qty:
+            self.levels[side][price] = level_qty
+        else:
+            self.levels[side].pop(price, None)
+
+        return True
+
+    def catch_up(self, feed, book):
+        snapshot, messages = feed.recover(book, self.seq)
+
+        if snapshot is not None:
+            self.load(snapshot)
+
+        for message in messages:
+            self.apply(message)
+
+    # returns the top n price levels of one side as (price, shares) tuples, best price first
+    def depth(self, side, n=engine.DEPTH_LEVELS):
+        levels = self.levels[side]
+        return [(price, levels[price]) for price in sorted(levels, reverse=side == engine.BUY)[:n]]
@@ -1,41 +1,40 @@
-from flask import Flask, request, redirect
-from processing import init_lob, gen_order, process_order, reformat_lob, reformat_order, get_spread
+import json
+import os
+import re
+from string import Template
+from flask import Flask, Response, request, redirect, abort
+from processing import gen_order, process_order, page_tables, reformat_order, get_depth, save_lob
+import engine
+import service
+from metrics import attach_metrics, read_metrics, render_prometheus
+from analytics import attach_analytics, read_analytics
 
 # FRONT END #
 
-# Initial state of variables displayed on website
-lob = init_lob()
-order = gen_order()
-spread = get_spread(lob)
+# Every book is saved to a snapshot file in this folder after every change so that a restarted server picks up
+# where it left off (LOB_SNAPSHOT_DIR, or the folder of this file if it is not set)
+SNAPSHOT_DIR = os.environ.get("LOB_SNAPSHOT_DIR", os.path.dirname(os.path.abspath(__file__)))
 
-# Defining a Flask application
-app = Flask(__name__)
-app.config["DEBUG"] = True
-
-# Displaying the main page
-@app.route("/", methods=["GET", "POST"])
-def hello_world():
+# Besides the default book, any number of named books can be used by adding ?book=<name> to a URL
+DEFAULT_BOOK = service.DEFAULT_BOOK
+BOOK_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
 
-    if request.method == "POST":
-        # We handle the appropriate post action
-        global lob, order, spread
+# Every book is timed and counted for the /metrics page unless LOB_METRICS is set to 0
+METRICS = os.environ.get("LOB_METRICS", "1") != "0"
 
-        if request.form.get("submit_button") == "Process Order":
-            # We process the randomly generated order and redirect
-            lob = process_order(lob, order)
-            spread = get_spread(lob)
-            order = gen_order()
+# Market quality statistics are kept for every book for the /analytics page unless LOB_ANALYTICS is set to 0
+ANALYTICS = os.environ.get("LOB_ANALYTICS", "1") != "0"
 
-            return redirect("http://sahilg13.pythonanywhere.com")
-        else:
-            # We clear the book and redirect
-            lob = init_lob()
-            spread = get_spread(lob)
+# Every book keeps a writer thread and its book in memory, so no more than LOB_MAX_BOOKS books are opened
+# (0 for any number)
+MAX_BOOKS = int(os.environ.get("LOB_MAX_BOOKS", "64"))
 
-            return redirect("http://sahilg13.pythonanywhere.com")
+# The most price levels a depth request or stream can ask for, since a request for more levels than a view holds
+# reads them from the book on its writer thread
+MAX_LEVELS = 100
 
-    # We display all elements of our webpage including the order and book
-    return '''
+# The main page, filled in with the name of the book, the order table, the bid-ask spread and the book table
+PAGE = Template('''
         <html>
             <head>
                 <title>Limit Order Book Simulator</title>
@@ -43,6 +42,7 @@ def hello_world():
             <h1>Limit Order Book Simulator</h1>
             <body style="background-color:grey;">
                 <form method="post" action=".">
+                    <input type="hidden" name="book" value="$book" />
                     <h2 style="display:inline;">Randomly Generated Order</h2>
                     <input type="submit" style="background-color: rgb(159, 183, 141); border: 3px solid rgb(73, 136, 85);" name="submit_button" value="Process Order" />
                     <br>
@@ -50,15 +50,225 @@ def hello_world():
                 </form>
             </body>
         </html>
-    ''' + "<style type=\"text/css\">" + "\n" + "\t" + "table    {border:ridge 5px black; background-image:url(https://img.rawpixel.com/s3fs-private/rawpixel_images/website_content/v1008-22-c-x.jpg?w=1200&h=1200&dpr=1&fit=clip&crop=default&fm=jpg&q=75&vib=3&con=3&usm=15&cs=srgb&bg=F4F4F3&ixlib=js-2.2.1&s=34830f4633b34d78b97cf2bd6ff017c6);}" + "\n" + "\t" + "table td {border:inset 1px #000;}" + "\n" + "</style>" + "\n" + reformat_order(order).to_html(index=False, na_rep = "-") + '''
+    <style type="text/css">
+	table    {border:ridge 5px black; background-image:url(https://img.rawpixel.com/s3fs-private/rawpixel_images/website_content/v1008-22-c-x.jpg?w=1200&h=1200&dpr=1&fit=clip&crop=default&fm=jpg&q=75&vib=3&con=3&usm=15&cs=srgb&bg=F4F4F3&ixlib=js-2.2.1&s=34830f4633b34d78b97cf2bd6ff017c6);}
+	table td {border:inset 1px #000;}
+</style>
+$order_table
         <html>
             <br>
             <form method="post" action=".">
+                <input type="hidden" name="book" value="$book" />
                 <h2 style="display:inline;">Limit Order Book</h2>
                 <input type="submit" style="background-color: rgb(159, 183, 141); border: 3px solid rgb(73, 136, 85);" name="submit_button" value="Clear Book" />
                 <br>
                 <br>
-                <a>Current Bid-Ask Spread: {spd}</a>
+                <a>Current Bid-Ask Spread: $spread</a>
             </form>
         <html>
-    '''.format(spd = spread) + reformat_lob(lob).to_html(index=False, na_rep = "-")
\ No newline at end of file
+    $book_table''')
+
+# Returns the snapshot file of the book with the given name
+def snapshot_path(name):
+    return service.snapshot_path(SNAPSHOT_DIR, name)
+
+# Loads the book with the given name from its snapshot file, or starts an empty book
+def load_book(name):
+    book = service.load_book(SNAPSHOT_DIR, name)
+
+    if METRICS:
+        attach_metrics(book)
+
+    if ANALYTICS:
+        attach_analytics(book)
+
+    return book
+
+# The books are kept by book services, which carry out every change on a single writer thread.
+# When the site runs in several worker processes, LOB_SERVICE_ADDRESS (host:port) and LOB_SERVICE_AUTHKEY
+# point every worker at the one process that keeps the books (see service.py), so that they all share them.
+# The metrics and the analytics of those books, the most books that can be opened and the folder the books
+# are loaded from are then set with the --metrics, --analytics, --max-books and --snapshot-dir options of the
+# book server.
+if os.environ.get("LOB_SERVICE_ADDRESS"):
+    host, port = os.environ["LOB_SERVICE_ADDRESS"].rsplit(":", 1)
+    books = service.connect((host, int(port)), os.environ["LOB_SERVICE_AUTHKEY"].encode())
+else:
+    books = service.BookRegistry(load_book, MAX_BOOKS or None)
+
+# The last page rendered for each book, along with the version of the book and the ID of the order it was
+# rendered for (the order waiting to be processed is kept by the book service, see service.py)
+rendered = {}
+
+# Defining a Flask application
+app = Flask(__name__)
+app.config["DEBUG"] = True
+
+# Returns the name of the book a request is for
+def book_name():
+    name = request.values.get("book", DEFAULT_BOOK)
+
+    if not BOOK_NAME.match(name):
+        abort(400)
+
+    return name
+
+# Returns the number of price levels a request asks for, capped at MAX_LEVELS, or answers 400 if it is below 1
+def depth_levels():
+    levels = request.args.get("levels", default=engine.DEPTH_LEVELS, type=int)
+
+    if levels < 1:
+        abort(400)
+
+    return min(levels, MAX_LEVELS)
+
+# Returns the book service of the book with the given name, or answers 429 if no more books can be opened
+def open_book(name):
+    try:
+        return books.get(name)
+    except service.TooManyBooks:
+        abort(429)
+
+# Renders the main page, or hands back the last rendering if neither the book nor the order has changed since
+def render_page(name):
+    book = open_book(name)
+    order = book.pending_order(gen_order)
+    order_id = order["Order ID"][0]
+    cached = rendered.get(name)
+
+    if cached is None or cached[0] != tuple(book.view().version) or cached[1] != order_id:
+        # the spread and the book table are read in one request on the writer thread, so they always match
+        # each other and the version they are cached under
+        version, (spread, book_table) = book.read(page_tables)
+        cached = rendered[name] = (tuple(version), order_id, PAGE.substitute(book=name,
+                                                                          order_table=reformat_order(order).to_html(index=False, na_rep = "-"),
+                                                                          spread=spread,
+                                                                          book_table=book_table.to_html(index=False, na_rep = "-")))
+
+    return cached[2]
+
+# Returns the top price levels of a view with the prices in dollars, in the same layout as get_depth
+def view_depth(view, levels):
+    return {"bids" : [(engine.to_price(price), shares, count) for price, shares, count in view.bids[:levels]],
+            "asks" : [(engine.to_price(price), shares, count) for price, shares, count in view.asks[:levels]]}
+
+# Returns the top price levels of a book, from its latest view if that holds enough levels
+def read_depth(book, view, levels):
+    if levels <= engine.DEPTH_LEVELS:
+        return view_depth(view, levels)
+
+    return book.call(get_depth, levels)
+
+# Returns the bid-ask spread of a view in the same format as get_spread
+def view_spread(view):
+    return "-" if view.spread is None else "$" + "{:.2f}".format(engine.to_price(view.spread))
+
+# Lists the price levels that differ between two depth readings, with 0 shares for a level that is gone
+def depth_changes(old, new):
+    changes = {}
+
+    for side in ("bids", "asks"):
+        before = {price : (shares, count) for price, shares, count in old[side]}
+        after = {price : (shares, count) for price, shares, count in new[side]}
+        changes[side] = [[price, shares, count] for price, (shares, count) in after.items() if before.get(price) != (shares, count)]
+        changes[side] += [[price, 0, 0] for price in before if price not in after]
+
+    return changes
+
+# Displaying the main page
+@app.route("/", methods=["GET", "POST"])
+def hello_world():
+    name = book_name()
+
+    if request.method == "POST":
+        # We handle the appropriate post action
+        book = open_book(name)
+
+        if request.form.get("submit_button") == "Process Order":
+            # We process the randomly generated order and redirect
+            book.process_pending_order(process_order, gen_order)
+            book.call(save_lob, snapshot_path(name))
+        else:
+            # We clear the book and redirect
+            book.reset()
+            book.call(save_lob, snapshot_path(name))
+
+        if name == DEFAULT_BOOK:
+            return redirect("http://sahilg13.pythonanywhere.com")
+        else:
+            return redirect("http://sahilg13.pythonanywhere.com/?book=" + name)
+
+    # We display all elements of our webpage including the order and book
+    return render_page(name)
+
+# Returning the top price levels of the book as JSON, e.g. /depth?levels=5
+@app.route("/depth")
+def depth():
+    book = open_book(book_name())
+    levels = depth_levels()
+    view = book.view()
+    payload = dict(read_depth(book, view, levels), version=view.version, spread=view_spread(view))
+
+    return Response(json.dumps(payload), mimetype="application/json")
+
+# Streaming changes to the top price levels of the book as server-sent events, e.g. /stream?levels=5
+# The first event (and the first event after the book is cleared) has every level and "reset" set to true,
+# and every event after that only has the levels that changed
+@app.route("/stream")
+def stream():
+    book = open_book(book_name())
+    levels = depth_levels()
+
+    def events():
+        key = None
+        last_depth = None
+
+        while True:
+            view = book.view() if key is None else book.wait_for_change(key, 15)
+            new_key = tuple(view.version)
+
+            if new_key == key:
+                # nothing changed, so we just keep the connection open
+                yield ": keep-alive\n\n"
+                continue
+
+            new_depth = read_depth(book, view, levels)
+
+            if key is None or new_key[0] != key[0]:
+                payload = dict(new_depth, reset=True)
+            else:
+                payload = dict(depth_changes(last_depth, new_depth), reset=False)
+
+            payload["version"] = new_key
+            key = new_key
+            last_depth = new_depth
+
+            yield "data: " + json.dumps(payload) + "\n\n"
+
+    return Response(events(), mimetype="text/event-stream", headers={"Cache-Control" : "no-cache"})
+
+# Returning the metrics of every book in the Prometheus text format
+@app.route("/metrics")
+def metrics():
+    snapshots = {}
+
+    for name in books.names():
+        snapshot = books.get(name).call(read_metrics)
+
+        if snapshot is not None:
+            snapshots[name] = snapshot
+
+    return Response(render_prometheus(snapshots), mimetype="text/plain; version=0.0.4")
+
+# Returning the market quality statistics of the book as JSON, e.g. /analytics?book=<name>, with the
+# prices and spreads in dollars (the statistics are null if the book keeps none)
+@app.route("/analytics")
+def market_quality():
+    snapshot = open_book(book_name()).call(read_analytics)
+
+    if snapshot is not None:
+        for name in ("vwap", "effective_spread", "realized_spread", "mid"):
+            if snapshot[name] is not None:
+                snapshot[name] = engine.to_price(snapshot[name])
+
+    return Response(json.dumps(snapshot), mimetype="application/json")
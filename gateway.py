@@ -0,0 +1,323 @@
+import argparse
+import asyncio
+import struct
+import time
+import numpy as np
+import batch
+import engine
+
+# ORDER GATEWAY #
+
+#####
+# These are the messages of the gateway protocol. Every message starts with a
+# one-byte kind, which also fixes its length, and all fields are little-endian.
+# Prices are in ticks. Every message a client sends carries a tag of its own
+# choosing, which the gateway echoes back in the acknowledgement.
+#
+#   NEW      kind, tag (u32), order ID (i64), order type (i8), side (i8), price (i32), shares (i32)
+#   CANCEL   kind, tag (u32), order ID (i64)
+#   REPLACE  kind, tag (u32), order ID (i64), price (i32), shares (i32)
+#   ACK      kind, tag (u32), order ID (i64), status (i8)
+#   FILL     kind, aggressor ID (i64), resting ID (i64), price (i32), shares (i32), time (i64)
+#
+# A new order with order ID 0 is given the next free ID of the book, which comes
+# back in its acknowledgement. A replace with a price of 0 keeps the current price
+# and one with shares of -1 keeps the current quantity. A new order or a replace
+# is rejected (with the REJECTED status) unless its side is 1 (buy) or -1 (sell),
+# its order type is 0 (limit) or 1 (market), its number of shares is above 0 and
+# the price of a limit order is above 0. The status of an acknowledgement is one
+# of the engine status codes. A fill is sent to the owner of the incoming order
+# and to the owner of the resting order.
+#####
+NEW = 1
+CANCEL = 2
+REPLACE = 3
+ACK = 16
+FILL = 17
+
+KEEP_PRICE = 0
+KEEP_QTY = -1
+
+MESSAGES = {NEW : struct.Struct("<BIqbbii"),
+            CANCEL : struct.Struct("<BIq"),
+            REPLACE : struct.Struct("<BIqii"),
+            ACK : struct.Struct("<BIqb"),
+            FILL : struct.Struct("<Bqqiiq")}
+
+#####
+# This function splits the start of a buffer into messages. It returns the
+# messages as tuples (starting with their kind) along with the number of bytes
+# used, leaving a message that has not fully arrived yet for the next call. A
+# ValueError is raised for a kind that is not in kinds.
+#####
+def decode(buffer, kinds):
+    messages = []
+    pos = 0
+    end = len(buffer)
+
+    while pos < end:
+        message = MESSAGES[buffer[pos]] if buffer[pos] in kinds else None
+
+        if message is None:
+            raise ValueError("unknown message kind {}".format(buffer[pos]))
+
+        if pos + message.size > end:
+            break
+
+        messages.append(message.unpack_from(buffer, pos))
+        pos += message.size
+
+    return messages, pos
+
+#####
+# These functions check the fields of a new order and of a replace as they came
+# off the network, before they get anywhere near the book.
+#####
+def _valid_new(order_type, side, price, qty):
+    if side != engine.BUY and side != engine.SELL:
+        return False
+
+    if order_type == engine.MARKET:
+        return qty > 0
+
+    return order_type == engine.LIMIT and qty > 0 and price > 0
+
+def _valid_replace(price, qty):
+    return (price == KEEP_PRICE or price > 0) and (qty == KEEP_QTY or qty > 0)
+
+#####
+# A gateway takes orders from any number of TCP connections into one book. Since
+# the event loop runs on a single thread, only one batch is ever being matched at
+# a time. Whatever a connection has sent by the time it is read is decoded and
+# matched as one batch, and the acknowledgements and fills that the batch produces
+# are written to each connection in one go. A connection can only cancel or
+# replace its own orders.
+#####
+class Gateway:
+    def __init__(self, book=None):
+        self.book = engine.init_book() if book is None else book
+        self.owners = {}
+
+    async def handle(self, reader, writer):
+        buffer = bytearray()
+
+        try:
+            while True:
+                data = await reader.read(1 << 16)
+
+                if not data:
+                    break
+
+                buffer += data
+                messages, used = decode(buffer, (NEW, CANCEL, REPLACE))
+                del buffer[:used]
+
+                if messages:
+                    self.process(messages, writer)
+                    await writer.drain()
+        except (ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def process(self, messages, writer):
+        book = self.book
+        owners = self.owners
+        now = time.time_ns()
+        out = {writer : []}
+        ack = MESSAGES[ACK].pack
+        fill = MESSAGES[FILL].pack
+        fills = []
+
+        for message in messages:
+            kind, tag, order_id = message[:3]
+            first = len(fills)
+
+            if kind == NEW:
+                _, _, _, order_type, side, price, qty = message
+
+                if not _valid_new(order_type, side, price, qty):
+                    out[writer].append(ack(ACK, tag, order_id, engine.REJECTED))
+                    continue
+
+                if order_id == 0:
+                    order_id = engine.next_order_id(book)
+
+                try:
+                    status = engine.submit_order(book, order_type, side, price, qty, now, order_id, fills)
+                except ValueError:
+                    # the order ID is already resting in the book
+                    status = engine.REJECTED
+
+                if order_id in book.orders and order_id not in owners:
+                    owners[order_id] = writer
+            elif owners.get(order_id) is not writer:
+                status = engine.NOT_FOUND
+            elif kind == CANCEL:
+                status = engine.cancel_order(book, order_id)
+                owners.pop(order_id, None)
+            else:
+                _, _, _, price, qty = message
+
+                if not _valid_replace(price, qty):
+                    out[writer].append(ack(ACK, tag, order_id, engine.REJECTED))
+                    continue
+
+                status = engine.replace_order(book, order_id, None if price == KEEP_PRICE else price,
+                                              None if qty == KEEP_QTY else qty, now, fills)
+
+                if order_id not in book.orders:
+                    owners.pop(order_id, None)
+
+            out[writer].append(ack(ACK, tag, order_id, status))
+
+            for aggressor_id, resting_id, price, qty, fill_time in fills[first:]:
+                message = fill(FILL, aggressor_id, resting_id, price, qty, fill_time)
+                out[writer].append(message)
+                owner = owners.get(resting_id)
+
+                if resting_id not in book.orders:
+                    owners.pop(resting_id, None)
+
+                if owner is not None and owner is not writer:
+                    out.setdefault(owner, []).append(message)
+
+        for owner, data in out.items():
+            if not owner.is_closing():
+                owner.write(b"".join(data))
+
+#####
+# This function runs a gateway on the given address until it is stopped.
+#####
+async def serve(host, port, book=None):
+    gateway = Gateway(book)
+    server = await asyncio.start_server(gateway.handle, host, port)
+
+    async with server:
+        await server.serve_forever()
+
+#####
+# This function encodes a load generator workload: n orders drawn by gen_orders
+# (the batch version of gen_order, so the orders follow the same rules), with
+# order IDs from start onwards. A cancel_rate share of the messages cancel one of
+# the last 1000 orders sent instead. The tag of every message is its position.
+#####
+def gen_messages(n, cancel_rate=0.0, max_qty=1, seed=None, start=1):
+    rng = np.random.default_rng(seed)
+    orders = batch.gen_orders(n, seed=rng, start=start, max_qty=max_qty)
+    cancel = (rng.random(n) < cancel_rate) & (np.arange(n) > 0)
+    targets = orders["order_id"] - rng.integers(1, 1001, size=n)
+    new = MESSAGES[NEW].pack
+    cancel_message = MESSAGES[CANCEL].pack
+    messages = []
+
+    for tag, (order, is_cancel, target) in enumerate(zip(orders.tolist(), cancel.tolist(), targets.tolist())):
+        order_id, _, order_type, side, price, qty = order
+
+        if is_cancel:
+            messages.append(cancel_message(CANCEL, tag, max(target, start)))
+        else:
+            messages.append(new(NEW, tag, order_id, order_type, side, price, qty))
+
+    return messages
+
+#####
+# This function drives a gateway with the given messages over one connection and
+# measures it. Messages are sent in bursts of burst messages, with at most window
+# messages waiting for their acknowledgement at any time. The latency of a message
+# is the time from writing it to reading its acknowledgement. The function returns
+# the sustained messages per second, the latency percentiles in nanoseconds, the
+# number of fills received and the number of acknowledgements with each status.
+#####
+async def run_load(host, port, messages, window=1000, burst=64):
+    n = len(messages)
+    timer = time.perf_counter_ns
+    sent_at = np.zeros(n, dtype=np.int64)
+    acked_at = np.zeros(n, dtype=np.int64)
+    statuses = np.zeros(n, dtype=np.int8)
+    counts = {"acks" : 0, "fills" : 0}
+    acked = asyncio.Event()
+
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def receive():
+        buffer = bytearray()
+
+        while counts["acks"] < n:
+            data = await reader.read(1 << 16)
+
+            if not data:
+                raise ConnectionError("the gateway closed the connection")
+
+            now = timer()
+            buffer += data
+            replies, used = decode(buffer, (ACK, FILL))
+            del buffer[:used]
+
+            for reply in replies:
+                if reply[0] == ACK:
+                    acked_at[reply[1]] = now
+                    statuses[reply[1]] = reply[3]
+                    counts["acks"] += 1
+                else:
+                    counts["fills"] += 1
+
+            acked.set()
+
+    receiver = asyncio.ensure_future(receive())
+    start = timer()
+
+    for i in range(0, n, burst):
+        while i - counts["acks"] >= window:
+            acked.clear()
+            await acked.wait()
+
+        sent_at[i:i + burst] = timer()
+        writer.write(b"".join(messages[i:i + burst]))
+        await writer.drain()
+
+    await receiver
+    elapsed = timer() - start
+    writer.close()
+
+    latencies = acked_at - sent_at
+    return {"messages_per_sec" : n / (elapsed / 1e9),
+            "p50_ns" : float(np.percentile(latencies, 50)),
+            "p99_ns" : float(np.percentile(latencies, 99)),
+            "p99.9_ns" : float(np.percentile(latencies, 99.9)),
+            "max_ns" : int(latencies.max()),
+            "fills" : counts["fills"],
+            "statuses" : {int(status) : int(count) for status, count in zip(*np.unique(statuses, return_counts=True))}}
+
+#####
+# The gateway and the load generator are run from the command line, for example:
+#
+#     python gateway.py serve --port 9000
+#     python gateway.py load --port 9000 --orders 100000 --cancel-rate 0.2
+#
+# Run the load generator against a fresh gateway, or give it a --start order ID
+# that the gateway has not seen yet.
+#####
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Order entry gateway for the limit order book.")
+    parser.add_argument("mode", choices=["serve", "load"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--orders", type=int, default=100000, help="number of messages the load generator sends")
+    parser.add_argument("--cancel-rate", type=float, default=0.0)
+    parser.add_argument("--max-qty", type=int, default=1)
+    parser.add_argument("--window", type=int, default=1000, help="most messages waiting for an acknowledgement")
+    parser.add_argument("--burst", type=int, default=64, help="messages written at a time")
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--start", type=int, default=1, help="first order ID the load generator uses")
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        asyncio.run(serve(args.host, args.port))
+    else:
+        messages = gen_messages(args.orders, args.cancel_rate, args.max_qty, args.seed, args.start)
+        result = asyncio.run(run_load(args.host, args.port, messages, args.window, args.burst))
+
+        print("{:,.0f} msg/s  p50={:,.0f}ns p99={:,.0f}ns p99.9={:,.0f}ns max={:,}ns  fills={:,}".format(
+            result["messages_per_sec"], result["p50_ns"], result["p99_ns"], result["p99.9_ns"], result["max_ns"], result["fills"]))
+        print("acknowledgements by status:", result["statuses"])
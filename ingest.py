@@ -0,0 +1,201 @@
+import argparse
+import numpy as np
+import pandas as pd
+import engine
+
+# STREAMING INGEST #
+
+#####
+# These are the event types of a LOBSTER-style message file. Every row of such a
+# file is one message: the time in seconds after midnight, the event type, the
+# order ID, the number of shares, the price in dollars times 10000, and the
+# direction (1 for a buy order, -1 for a sell order, which for an execution is the
+# side of the resting order that was executed).
+#####
+NEW_ORDER = 1
+PARTIAL_CANCEL = 2
+DELETE = 3
+EXECUTION = 4
+HIDDEN_EXECUTION = 5
+CROSS_TRADE = 6
+TRADING_HALT = 7
+
+COLUMNS = ["time", "event", "order_id", "size", "price", "direction"]
+
+# LOBSTER prices are in dollars times 10000, and the engine counts in cents
+PRICE_DIVISOR = 10000 // engine.TICKS_PER_DOLLAR
+
+#####
+# This is the layout of the messages once they are read, with the time in
+# nanoseconds after midnight and the price in ticks.
+#####
+MESSAGE_DTYPE = np.dtype([("time", np.int64),
+                          ("event", np.int8),
+                          ("order_id", np.int64),
+                          ("size", np.int32),
+                          ("price", np.int32),
+                          ("direction", np.int8)])
+
+#####
+# This is the layout of the top-of-book series: the best bid and the best ask in
+# ticks along with the number of shares at each (0 where a side is empty), as of
+# right after each message.
+#####
+TOP_DTYPE = np.dtype([("time", np.int64),
+                      ("bid", np.int32),
+                      ("bid_qty", np.int32),
+                      ("ask", np.int32),
+                      ("ask_qty", np.int32)])
+
+#####
+# This function turns one chunk of a message file (a data frame or a dictionary of
+# columns) into an array with the MESSAGE_DTYPE layout.
+#####
+def _to_messages(columns):
+    messages = np.empty(len(columns["time"]), dtype=MESSAGE_DTYPE)
+    messages["time"] = np.rint(np.asarray(columns["time"], dtype=np.float64) * 1e9)
+    messages["event"] = columns["event"]
+    messages["order_id"] = columns["order_id"]
+    messages["size"] = columns["size"]
+    messages["price"] = np.asarray(columns["price"], dtype=np.int64) // PRICE_DIVISOR
+    messages["direction"] = columns["direction"]
+    return messages
+
+#####
+# This function reads a message file one chunk at a time and yields each chunk as
+# an array with the MESSAGE_DTYPE layout, so only one chunk is ever held in memory.
+# A CSV file is read with pandas and is expected to have no header, like the
+# LOBSTER files, while a Parquet file (read with pyarrow) is expected to have the
+# columns named in COLUMNS.
+#####
+def read_messages(path, chunk_size=1000000):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for record_batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=COLUMNS):
+            yield _to_messages({name : record_batch.column(name).to_numpy() for name in COLUMNS})
+    else:
+        # only the six message columns are read, since some files carry extra padding columns
+        for chunk in pd.read_csv(path, header=None, names=COLUMNS, usecols=range(len(COLUMNS)), chunksize=chunk_size,
+                                 dtype={"time" : np.float64, "event" : np.int8, "order_id" : np.int64,
+                                        "size" : np.int64, "price" : np.int64, "direction" : np.int8}):
+            yield _to_messages(chunk)
+
+#####
+# This function applies a chunk of messages to the book and returns the top of
+# the book after every message, with the TOP_DTYPE layout. A new order is
+# submitted as a limit order, a partial cancel or an execution takes shares off
+# the resting order it names (keeping its place in the queue), and a deletion
+# cancels it. Hidden executions, cross trades and trading halts leave the visible
+# book as it is. Messages about orders that are not in the book (for example
+# orders placed before the file starts) are skipped, and so are new orders whose
+# ID is already resting.
+#####
+def replay_messages(book, messages):
+    rows = []
+    orders = book.orders
+    bids = book.bids
+    asks = book.asks
+
+    for time, event, order_id, size, price, direction in messages.tolist():
+        if event == NEW_ORDER:
+            if order_id not in orders:
+                engine.submit_order(book, engine.LIMIT, direction, price, size, time, order_id)
+        elif event == PARTIAL_CANCEL or event == EXECUTION:
+            order = orders.get(order_id)
+
+            if order is not None:
+                if order.qty > size:
+                    engine.replace_order(book, order_id, None, order.qty - size, time)
+                else:
+                    engine.cancel_order(book, order_id)
+        elif event == DELETE:
+            engine.cancel_order(book, order_id)
+
+        bid = engine.best_price(bids)
+        ask = engine.best_price(asks)
+        rows.append((time,
+                     0 if bid is None else bid, 0 if bid is None else bids.levels[bid].volume,
+                     0 if ask is None else ask, 0 if ask is None else asks.levels[ask].volume))
+
+    return np.array(rows, dtype=TOP_DTYPE)
+
+#####
+# This class writes a series of structured arrays, such as the top-of-book series,
+# to a CSV or Parquet file (picked by the extension of the path) one chunk at a
+# time, so the series never has to be held in memory as a whole. Each chunk of a
+# Parquet file becomes one row group.
+#####
+class ChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self.writer = None
+        self.file = None
+
+    def write(self, chunk):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.table({name : chunk[name] for name in chunk.dtype.names})
+
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+
+            self.writer.write_table(table)
+        else:
+            header = self.file is None
+
+            if header:
+                self.file = open(self.path, "w", newline="")
+
+            pd.DataFrame(chunk).to_csv(self.file, header=header, index=False)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+        if self.file is not None:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+#####
+# This function replays a whole message file through a book (an empty one unless
+# a book is given), one chunk at a time, writing the top-of-book series to output
+# as it goes. Memory use depends on the chunk size and the size of the book, not on
+# the size of the file. The function returns the book and the number of messages
+# replayed.
+#####
+def replay_file(path, output, chunk_size=1000000, book=None):
+    if book is None:
+        book = engine.init_book()
+
+    n = 0
+
+    with ChunkWriter(output) as writer:
+        for messages in read_messages(path, chunk_size):
+            writer.write(replay_messages(book, messages))
+            n += len(messages)
+
+    return book, n
+
+#####
+# The loader is used from the command line, for example:
+#
+#     python ingest.py AAPL_2012-06-21_message_10.csv top.parquet
+#####
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a LOBSTER-style message file through the limit order book.")
+    parser.add_argument("messages", help="CSV or Parquet message file")
+    parser.add_argument("output", help="CSV or Parquet file to write the top-of-book series to")
+    parser.add_argument("--chunk-size", type=int, default=1000000)
+    args = parser.parse_args()
+
+    book, n = replay_file(args.messages, args.output, args.chunk_size)
+    print("replayed {:,} messages, {:,} orders resting at the end".format(n, len(book.orders)))
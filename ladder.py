@@ -0,0 +1,364 @@
+import engine
+from engine import BUY, SELL, LIMIT, MARKET, RESTED, FILLED, REJECTED, CANCELLED, NOT_FOUND, PARTIAL
+
+# ARRAY LADDER ENGINE #
+
+#####
+# This is an alternative matching engine for instruments that only trade within a
+# known, narrow band of prices, such as the $70.00 to $80.99 band of gen_order. It
+# behaves like engine.py (same status codes, same fills, same price-time priority)
+# but keeps the book in flat arrays that are allocated up front and indexed by
+# tick, so adding an order, filling one and finding the best price take a fixed
+# number of steps. The arrays are plain Python lists rather than NumPy arrays:
+# every access from Python code turns an element of a NumPy array into a new
+# Python integer, which makes it about twice as slow as reading a list, and the
+# ladder never does any work on a whole array at once. The ladder has no journal,
+# metrics or auction mode.
+#####
+
+# the number of price ticks covered by one word of the occupancy bitmap
+WORD_BITS = 64
+
+#####
+# One side of the ladder. For every tick in the band it keeps the number of
+# shares resting there, the number of orders and the first and last order of the
+# queue at that price (-1 if there is none). The occupancy bitmap has one bit per
+# tick that is set while any order rests there, held in words of WORD_BITS ticks
+# each, and best is the tick (counted from the bottom of the band) of the best
+# price, or -1 if the side is empty.
+#####
+class LadderSide:
+    __slots__ = ("side", "volume", "count", "head", "tail", "bits", "best")
+
+    def __init__(self, side, ticks):
+        self.side = side
+        self.volume = [0] * ticks
+        self.count = [0] * ticks
+        self.head = [-1] * ticks
+        self.tail = [-1] * ticks
+        self.bits = [0] * ((ticks + WORD_BITS - 1) // WORD_BITS)
+        self.best = -1
+
+#####
+# The ladder book. The resting orders live in a pool of slots, one array per
+# field, and the slots of a price level are chained into a FIFO queue through the
+# next/prev arrays. Free slots are chained through the next array as well, starting
+# at free, and the pool doubles in size if it ever runs out. The orders dictionary
+# maps the ID of every resting order to its slot.
+#####
+class LadderBook:
+    __slots__ = ("min_price", "max_price", "bids", "asks", "orders", "next_id", "free", "capacity",
+                 "ids", "qtys", "times", "ticks", "sides", "next", "prev")
+
+    def __init__(self, min_price, max_price, capacity):
+        if capacity < 1:
+            raise ValueError("the capacity of a ladder has to be at least 1")
+
+        self.min_price = min_price
+        self.max_price = max_price
+        self.bids = LadderSide(BUY, max_price - min_price + 1)
+        self.asks = LadderSide(SELL, max_price - min_price + 1)
+        self.orders = {}
+        self.next_id = 1
+        self.capacity = 0
+        self.free = -1
+
+        for name in ("ids", "qtys", "times", "ticks", "sides", "next", "prev"):
+            setattr(self, name, [])
+
+        _grow(self, capacity)
+
+#####
+# This function makes room for capacity orders in the pool, keeping the orders
+# that are already there.
+#####
+def _grow(book, capacity):
+    old = book.capacity
+    extra = capacity - old
+
+    for name in ("ids", "qtys", "times", "ticks", "sides", "prev"):
+        getattr(book, name).extend([0] * extra)
+
+    # the new slots go on the free list
+    book.next.extend(range(old + 1, capacity + 1))
+    book.next[-1] = book.free
+    book.free = old
+    book.capacity = capacity
+
+#####
+# This function initializes an empty ladder covering the prices from min_price to
+# max_price ticks (by default the $70.00 to $81.00 band of gen_order), with room
+# for capacity resting orders before the pool has to grow. The capacity has to be
+# at least 1, otherwise a ValueError is raised.
+#####
+def init_book(min_price=7000, max_price=8100, capacity=1 << 16):
+    return LadderBook(min_price, max_price, capacity)
+
+#####
+# These functions find the next occupied tick in a bitmap: the highest one at or
+# below tick, or the lowest one at or above tick (-1 if there is none). They only
+# look at whole words of the bitmap, so a band of a thousand ticks takes at most
+# sixteen steps.
+#####
+def _highest_at_or_below(bits, tick):
+    w = tick // WORD_BITS
+    word = bits[w] & ((2 << (tick % WORD_BITS)) - 1)
+
+    while not word:
+        w -= 1
+
+        if w < 0:
+            return -1
+
+        word = bits[w]
+
+    return w * WORD_BITS + word.bit_length() - 1
+
+def _lowest_at_or_above(bits, tick):
+    w = tick // WORD_BITS
+    word = bits[w] & ~((1 << (tick % WORD_BITS)) - 1)
+
+    while not word:
+        w += 1
+
+        if w == len(bits):
+            return -1
+
+        word = bits[w]
+
+    return w * WORD_BITS + (word & -word).bit_length() - 1
+
+def best_bid(book):
+    return None if book.bids.best < 0 else book.bids.best + book.min_price
+
+def best_ask(book):
+    return None if book.asks.best < 0 else book.asks.best + book.min_price
+
+def spread(book):
+    if book.bids.best < 0 or book.asks.best < 0:
+        return None
+    return book.asks.best - book.bids.best
+
+def mid_price(book):
+    if book.bids.best < 0 or book.asks.best < 0:
+        return None
+    return (book.asks.best + book.bids.best) / 2 + book.min_price
+
+#####
+# This function returns the top n price levels of one side of the ladder as
+# (price, shares, number of orders) tuples, like engine.get_depth.
+#####
+def get_depth(book, book_side, n=engine.DEPTH_LEVELS):
+    depth = []
+    tick = book_side.best
+
+    while tick >= 0 and len(depth) < n:
+        depth.append((tick + book.min_price, book_side.volume[tick], book_side.count[tick]))
+
+        if book_side.side == BUY:
+            tick = _highest_at_or_below(book_side.bits, tick - 1) if tick > 0 else -1
+        else:
+            tick = _lowest_at_or_above(book_side.bits, tick + 1) if tick + 1 < len(book_side.volume) else -1
+
+    return depth
+
+#####
+# This function marks a tick as empty and, if it was the best price, moves the
+# best price to the next occupied tick.
+#####
+def _empty_tick(book_side, tick):
+    bits = book_side.bits
+    bits[tick // WORD_BITS] &= ~(1 << (tick % WORD_BITS))
+
+    if tick == book_side.best:
+        if book_side.side == BUY:
+            book_side.best = _highest_at_or_below(bits, tick - 1) if tick > 0 else -1
+        else:
+            book_side.best = _lowest_at_or_above(bits, tick + 1) if tick + 1 < len(book_side.volume) else -1
+
+#####
+# This function adds an order to the back of the queue at its tick.
+#####
+def _add_order(book, book_side, order_id, tick, qty, time):
+    if book.free < 0:
+        _grow(book, 2 * book.capacity)
+
+    slot = book.free
+    book.free = book.next[slot]
+    book.ids[slot] = order_id
+    book.qtys[slot] = qty
+    book.times[slot] = time
+    book.ticks[slot] = tick
+    book.sides[slot] = book_side.side
+
+    tail = book_side.tail[tick]
+    book.prev[slot] = tail
+    book.next[slot] = -1
+
+    if tail < 0:
+        book_side.head[tick] = slot
+        book_side.bits[tick // WORD_BITS] |= 1 << (tick % WORD_BITS)
+
+        if book_side.best < 0 or (tick > book_side.best if book_side.side == BUY else tick < book_side.best):
+            book_side.best = tick
+    else:
+        book.next[tail] = slot
+
+    book_side.tail[tick] = slot
+    book_side.count[tick] += 1
+    book_side.volume[tick] += qty
+    book.orders[order_id] = slot
+
+#####
+# This function matches an incoming order with the opposite side, best price
+# first and oldest order first within a price, and returns the number of shares
+# that are left over. Orders that are filled completely go back on the free list.
+#####
+def _match(book, opposite, side, order_type, tick, qty, time, order_id, fills):
+    ids = book.ids
+    qtys = book.qtys
+    nexts = book.next
+    orders = book.orders
+    volume = opposite.volume
+    count = opposite.count
+    min_price = book.min_price
+
+    while qty:
+        best = opposite.best
+
+        if best < 0:
+            break
+
+        if order_type == LIMIT and (best > tick if side == BUY else best < tick):
+            break
+
+        slot = opposite.head[best]
+
+        while qty and slot >= 0:
+            resting = qtys[slot]
+            traded = resting if resting <= qty else qty
+
+            if fills is not None:
+                fills.append((order_id, ids[slot], best + min_price, traded, time))
+
+            qty -= traded
+            volume[best] -= traded
+
+            if traded < resting:
+                qtys[slot] = resting - traded
+                break
+
+            # the resting order is used up
+            del orders[ids[slot]]
+            count[best] -= 1
+            following = nexts[slot]
+            nexts[slot] = book.free
+            book.free = slot
+            slot = following
+
+        if slot >= 0:
+            opposite.head[best] = slot
+            book.prev[slot] = -1
+        else:
+            opposite.head[best] = -1
+            opposite.tail[best] = -1
+            _empty_tick(opposite, best)
+
+    return qty
+
+#####
+# This function processes an order against the ladder and returns one of the
+# engine status codes, exactly like engine.submit_order. The price of a limit
+# order has to lie inside the band of the ladder, otherwise a ValueError is raised.
+#####
+def submit_order(book, order_type, side, price, qty, time, order_id=None, fills=None):
+    if qty <= 0:
+        return REJECTED
+
+    if order_type == LIMIT and not book.min_price <= price <= book.max_price:
+        raise ValueError("price " + str(price) + " is outside of the ladder")
+
+    if order_id is None:
+        order_id = book.next_id
+        book.next_id += 1
+    elif order_id in book.orders:
+        raise ValueError("order ID " + str(order_id) + " is already resting in the book")
+    elif order_id >= book.next_id:
+        book.next_id = order_id + 1
+
+    if side == BUY:
+        opposite = book.asks
+        same = book.bids
+    else:
+        opposite = book.bids
+        same = book.asks
+
+    if order_type == MARKET and opposite.best < 0:
+        return REJECTED
+
+    tick = price - book.min_price
+    remaining = _match(book, opposite, side, order_type, tick, qty, time, order_id, fills)
+
+    if remaining == 0:
+        return FILLED
+
+    if order_type == MARKET:
+        return PARTIAL
+
+    _add_order(book, same, order_id, tick, remaining, time)
+    return RESTED if remaining == qty else PARTIAL
+
+#####
+# This function cancels a resting order given its ID. The order is found through
+# the ID index and unlinked from the queue at its tick.
+#####
+def cancel_order(book, order_id):
+    slot = book.orders.pop(order_id, None)
+
+    if slot is None:
+        return NOT_FOUND
+
+    book_side = book.bids if book.sides[slot] == BUY else book.asks
+    tick = book.ticks[slot]
+    prev = book.prev[slot]
+    following = book.next[slot]
+
+    if prev < 0:
+        book_side.head[tick] = following
+    else:
+        book.next[prev] = following
+
+    if following < 0:
+        book_side.tail[tick] = prev
+    else:
+        book.prev[following] = prev
+
+    book_side.count[tick] -= 1
+    book_side.volume[tick] -= book.qtys[slot]
+
+    if book_side.count[tick] == 0:
+        _empty_tick(book_side, tick)
+
+    book.next[slot] = book.free
+    book.free = slot
+    return CANCELLED
+
+#####
+# This function yields the resting orders of one side as (order ID, price, shares,
+# time) tuples in priority order.
+#####
+def iter_orders(book, book_side):
+    for price, _, _ in get_depth(book, book_side, len(book_side.volume)):
+        slot = book_side.head[price - book.min_price]
+
+        while slot >= 0:
+            yield book.ids[slot], price, book.qtys[slot], book.times[slot]
+            slot = book.next[slot]
+
+#####
+# Orders are matched as soon as they arrive, so the two sides of a ladder never
+# overlap and there is nothing for a market clearing to do. This function is here
+# so that the ladder can stand in for engine.py, and it always returns None.
+#####
+def clear_market(book):
+    return None
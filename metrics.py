@@ -0,0 +1,178 @@
+import time
+import engine
+
+# METRICS #
+
+#####
+# The latency histograms have one bucket per power of two nanoseconds, from
+# 128 ns up to about 134 ms (2^27 ns), and an overflow bucket above that. Finding
+# the bucket of a latency only takes its bit length, so recording it is cheap.
+#####
+FIRST_BUCKET_BITS = 7
+LAST_BUCKET_BITS = 27
+BUCKET_BOUNDS = [1 << bits for bits in range(FIRST_BUCKET_BITS, LAST_BUCKET_BITS + 1)]
+
+OPERATIONS = ("submit", "cancel", "replace")
+
+#####
+# These are the counters kept for a book, along with the help text they are
+# exported with.
+#####
+COUNTERS = {
+    "limit_orders" : "Limit orders submitted",
+    "market_orders" : "Market orders submitted",
+    "rejected_market_orders" : "Market orders rejected (an empty opposite side, or a book in auction mode)",
+    "inserts" : "Orders that came to rest in the book",
+    "fills" : "Executions",
+    "filled_shares" : "Shares executed",
+    "levels_touched" : "Price levels matched against by incoming orders",
+    "cancels" : "Orders cancelled",
+    "cancels_not_found" : "Cancels and replaces of orders that were not in the book",
+    "replaces" : "Orders replaced",
+}
+
+#####
+# A histogram of latencies in nanoseconds.
+#####
+class Histogram:
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0
+
+    def observe(self, ns):
+        bucket = (ns - 1).bit_length() - FIRST_BUCKET_BITS
+
+        if bucket < 0:
+            bucket = 0
+        elif bucket > len(BUCKET_BOUNDS):
+            bucket = len(BUCKET_BOUNDS)
+
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += ns
+
+#####
+# The metrics of one book. Once the metrics are attached to a book (see
+# attach_metrics), the engine times every submit, cancel and replace and reports
+# what happened through the record methods below. A book without metrics only
+# pays for checking that book.metrics is None.
+#####
+class Metrics:
+    __slots__ = ("clock", "latency", "counters")
+
+    def __init__(self):
+        self.clock = time.perf_counter_ns
+        self.latency = {operation : Histogram() for operation in OPERATIONS}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def _record_fills(self, fills, first):
+        counters = self.counters
+        prices = set()
+
+        for fill in fills[first:]:
+            counters["filled_shares"] += fill[3]
+            prices.add(fill[2])
+
+        counters["fills"] += len(fills) - first
+        counters["levels_touched"] += len(prices)
+
+    def record_submit(self, order_type, status, fills, first, elapsed):
+        counters = self.counters
+        self.latency["submit"].observe(elapsed)
+
+        if order_type == engine.MARKET:
+            counters["market_orders"] += 1
+
+            if status == engine.REJECTED:
+                counters["rejected_market_orders"] += 1
+        else:
+            counters["limit_orders"] += 1
+
+            if status == engine.RESTED or status == engine.PARTIAL:
+                counters["inserts"] += 1
+
+        self._record_fills(fills, first)
+
+    def record_cancel(self, status, elapsed):
+        self.latency["cancel"].observe(elapsed)
+        self.counters["cancels" if status == engine.CANCELLED else "cancels_not_found"] += 1
+
+    def record_replace(self, status, fills, first, elapsed):
+        counters = self.counters
+        self.latency["replace"].observe(elapsed)
+
+        if status == engine.NOT_FOUND:
+            counters["cancels_not_found"] += 1
+            return
+
+        counters["replaces"] += 1
+
+        if status == engine.RESTED or status == engine.PARTIAL:
+            counters["inserts"] += 1
+
+        self._record_fills(fills, first)
+
+    #####
+    # This method returns a copy of the metrics as plain dictionaries and lists:
+    # the counters by name, and the bucket counts, the count and the total latency
+    # in nanoseconds of every operation.
+    #####
+    def snapshot(self):
+        return {"counters" : dict(self.counters),
+                "latency" : {operation : {"buckets" : list(histogram.counts), "count" : histogram.count, "total_ns" : histogram.total}
+                             for operation, histogram in self.latency.items()}}
+
+#####
+# This function attaches metrics to a book (new, empty metrics unless some are
+# given) and returns them.
+#####
+def attach_metrics(book, metrics=None):
+    book.metrics = Metrics() if metrics is None else metrics
+    return book.metrics
+
+def detach_metrics(book):
+    book.metrics = None
+
+#####
+# This function returns a snapshot of the metrics attached to a book, or None if
+# the book has none.
+#####
+def read_metrics(book):
+    return None if book.metrics is None else book.metrics.snapshot()
+
+#####
+# This function returns the given snapshots in the Prometheus text format. The
+# snapshots are given as a dictionary from the name of each book to its snapshot,
+# and every sample is labelled with the name of its book.
+#####
+def render_prometheus(snapshots, prefix="lob"):
+    lines = []
+
+    for name, description in COUNTERS.items():
+        lines.append("# HELP {}_{}_total {}".format(prefix, name, description))
+        lines.append("# TYPE {}_{}_total counter".format(prefix, name))
+
+        for book, snapshot in snapshots.items():
+            lines.append('{}_{}_total{{book="{}"}} {}'.format(prefix, name, book, snapshot["counters"][name]))
+
+    histogram = prefix + "_operation_latency_seconds"
+    lines.append("# HELP {} Time taken by the matching engine per operation".format(histogram))
+    lines.append("# TYPE {} histogram".format(histogram))
+
+    for book, snapshot in snapshots.items():
+        for operation, latency in snapshot["latency"].items():
+            labels = 'book="{}",operation="{}"'.format(book, operation)
+            cumulative = 0
+
+            for bound, count in zip(BUCKET_BOUNDS, latency["buckets"]):
+                cumulative += count
+                lines.append('{}_bucket{{{},le="{:.9g}"}} {}'.format(histogram, labels, bound / 1e9, cumulative))
+
+            lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(histogram, labels, latency["count"]))
+            lines.append("{}_sum{{{}}} {:.9f}".format(histogram, labels, latency["total_ns"] / 1e9))
+            lines.append("{}_count{{{}}} {}".format(histogram, labels, latency["count"]))
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,132 @@
+import argparse
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import auction
+import batch
+import engine
+
+# MONTE CARLO #
+
+#####
+# This function runs one simulation like the one in Limit_Order_Book.py: n_orders
+# randomly generated orders are submitted to an empty book and the bid-ask spread
+# is recorded after every order. The book matches orders as they arrive, so it is
+# never crossed and there is nothing left for a market clearing to do. The day
+# therefore ends with a closing call auction: auction_orders more orders are
+# collected in auction mode (where limit orders rest without matching and market
+# orders are rejected) and the crossed book is then uncrossed at the price where
+# the most shares trade. Nothing is printed. The orders are drawn from the given
+# seed, so a simulation can always be reproduced from its seed. The function
+# returns the spread series in dollars (NaN where there is no spread) and the
+# equilibrium price of the closing auction (NaN if the book did not cross, which
+# is always the case when auction_orders is 0).
+#####
+def run_simulation(seed, n_orders=100, max_qty=1, auction_orders=100):
+    # the closing orders are drawn after the others, so the continuous part does not depend on auction_orders
+    rng = np.random.default_rng(seed)
+    orders = batch.gen_orders(n_orders, seed=rng, max_qty=max_qty)
+    closing = batch.gen_orders(auction_orders, seed=rng, start=n_orders + 1, max_qty=max_qty)
+    book = engine.init_book()
+    submit_order = engine.submit_order
+    spread = engine.spread
+    spreads = []
+
+    for order_id, time, order_type, side, price, qty in orders.tolist():
+        submit_order(book, order_type, side, price, qty, time, order_id)
+        spreads.append(spread(book))
+
+    spreads = np.array([np.nan if s is None else s for s in spreads], dtype=np.float64) / engine.TICKS_PER_DOLLAR
+
+    engine.set_auction_mode(book, True)
+
+    for order_id, time, order_type, side, price, qty in closing.tolist():
+        submit_order(book, order_type, side, price, qty, time, order_id)
+
+    clearing_price, _, _ = auction.uncross(book)
+    engine.set_auction_mode(book, False)
+
+    return spreads, np.nan if clearing_price is None else clearing_price
+
+#####
+# This function runs a chunk of simulations in a worker process and stacks their
+# results, so that a whole chunk is sent back to the parent process at once.
+#####
+def _run_chunk(seeds, n_orders, max_qty, auction_orders):
+    results = [run_simulation(seed, n_orders, max_qty, auction_orders) for seed in seeds]
+    return np.vstack([spreads for spreads, _ in results]), np.array([price for _, price in results])
+
+#####
+# This function runs n_sims independent simulations over a pool of worker
+# processes (one per core unless told otherwise). Each simulation gets its own
+# child of a numpy.random.SeedSequence built from seed, so the streams never
+# overlap and the whole run is reproducible no matter how the simulations are
+# split between workers. The simulations are handed out in chunks to keep the cost
+# of talking to the workers small. The function returns a dictionary with the
+# spread series of every simulation (an n_sims by n_orders array) and the
+# equilibrium price of the closing auction of every simulation.
+#####
+def run_monte_carlo(n_sims, n_orders=100, seed=123, workers=None, chunk_size=None, max_qty=1, auction_orders=100):
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if chunk_size is None:
+        chunk_size = max(1, n_sims // (workers * 4))
+
+    seeds = np.random.SeedSequence(seed).spawn(n_sims)
+    chunks = [seeds[i:i + chunk_size] for i in range(0, n_sims, chunk_size)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_run_chunk, chunks, [n_orders] * len(chunks), [max_qty] * len(chunks), [auction_orders] * len(chunks)))
+
+    return {"spreads" : np.vstack([spreads for spreads, _ in results]),
+            "clearing_prices" : np.concatenate([prices for _, prices in results])}
+
+#####
+# This function summarizes a Monte Carlo run: the mean and the 5th/50th/95th
+# percentiles of the spread at every step (ignoring simulations with no spread at
+# that step), and the distribution of the equilibrium price over the simulations
+# that had one.
+#####
+def summarize(results):
+    spreads = results["spreads"]
+    prices = results["clearing_prices"]
+    cleared = prices[~np.isnan(prices)]
+
+    # steps where no simulation has a spread yet come out as NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+
+        return {"spread_mean" : np.nanmean(spreads, axis=0),
+                "spread_p5" : np.nanpercentile(spreads, 5, axis=0),
+                "spread_p50" : np.nanpercentile(spreads, 50, axis=0),
+                "spread_p95" : np.nanpercentile(spreads, 95, axis=0),
+                "cleared_share" : len(cleared) / len(prices),
+                "clearing_price_mean" : cleared.mean() if len(cleared) else np.nan,
+                "clearing_price_std" : cleared.std() if len(cleared) else np.nan}
+
+#####
+# The runner is used from the command line, for example:
+#
+#     python montecarlo.py --sims 10000 --orders 100
+#
+# Only the summary is printed, once every simulation has finished.
+#####
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run many limit order book simulations in parallel.")
+    parser.add_argument("--sims", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--max-qty", type=int, default=1)
+    parser.add_argument("--auction-orders", type=int, default=100, help="orders collected for the closing auction (0 for none)")
+    args = parser.parse_args()
+
+    summary = summarize(run_monte_carlo(args.sims, args.orders, args.seed, args.workers, max_qty=args.max_qty,
+                                        auction_orders=args.auction_orders))
+
+    print("final bid-ask spread: mean {:.4f}, 5th percentile {:.4f}, median {:.4f}, 95th percentile {:.4f}".format(
+        summary["spread_mean"][-1], summary["spread_p5"][-1], summary["spread_p50"][-1], summary["spread_p95"][-1]))
+    print("simulations with an equilibrium price: {:.1%}".format(summary["cleared_share"]))
+    print("equilibrium price: mean {:.4f}, standard deviation {:.4f}".format(summary["clearing_price_mean"], summary["clearing_price_std"]))
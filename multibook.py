@@ -0,0 +1,326 @@
+import argparse
+import multiprocessing
+import time
+import zlib
+import numpy as np
+import batch
+import engine
+
+# MULTI-SYMBOL BOOKS #
+
+#####
+# These are the layouts of orders and fills that carry the symbol of their
+# instrument. They are the batch.py layouts with a symbol field added in front,
+# which holds symbols of up to SYMBOL_LENGTH characters. NumPy cuts a longer
+# symbol short without a word, which would put two instruments in one book, so
+# check_symbols should be used on symbols before they go into one of these arrays.
+#####
+SYMBOL_LENGTH = 8
+SYMBOL_DTYPE = "U" + str(SYMBOL_LENGTH)
+
+ORDER_DTYPE = np.dtype([("symbol", SYMBOL_DTYPE)] + batch.ORDER_DTYPE.descr)
+FILL_DTYPE = np.dtype([("symbol", SYMBOL_DTYPE)] + batch.FILL_DTYPE.descr)
+
+#####
+# This is the layout of a top-of-book update: the best bid and the best ask of a
+# symbol in ticks along with the number of shares at each (0 where a side is
+# empty), and the version of the book they were read at.
+#####
+TOP_DTYPE = np.dtype([("symbol", SYMBOL_DTYPE),
+                      ("bid", np.int32),
+                      ("bid_qty", np.int32),
+                      ("ask", np.int32),
+                      ("ask_qty", np.int32),
+                      ("version", np.int64)])
+
+#####
+# This function raises a ValueError if any of the given symbols is longer than
+# SYMBOL_LENGTH characters.
+#####
+def check_symbols(symbols):
+    for symbol in symbols:
+        if len(symbol) > SYMBOL_LENGTH:
+            raise ValueError("symbol " + repr(symbol) + " is longer than " + str(SYMBOL_LENGTH) + " characters")
+
+#####
+# This function generates a batch of n orders spread evenly at random over the
+# given symbols. Apart from the symbol, the orders follow the rules of gen_orders,
+# and the order IDs run from start onwards across all symbols. This function
+# returns a structured array with the ORDER_DTYPE layout, and raises a ValueError
+# for a symbol that does not fit in it.
+#####
+def gen_orders(n, symbols, seed=None, start=1, max_qty=1):
+    check_symbols(symbols)
+    rng = np.random.default_rng(seed)
+    orders = np.empty(n, dtype=ORDER_DTYPE)
+    single = batch.gen_orders(n, seed=rng, start=start, max_qty=max_qty)
+
+    for name in batch.ORDER_DTYPE.names:
+        orders[name] = single[name]
+
+    orders["symbol"] = np.asarray(symbols)[rng.integers(0, len(symbols), size=n)]
+    return orders
+
+#####
+# This function returns the position of every element of values in its sorted
+# unique values, along with those unique values and the bounds of each run in a
+# stable sort of values, so that the positions of the elements equal to uniques[i]
+# are order[bounds[i]:bounds[i + 1]], in their original order.
+#####
+def _group(values):
+    uniques, inverse = np.unique(values, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(len(uniques) + 1))
+    return uniques, order, bounds
+
+#####
+# A book manager holds one book per symbol, created the first time an order for
+# the symbol arrives.
+#####
+class BookManager:
+    def __init__(self):
+        self.books = {}
+
+    def get(self, symbol):
+        book = self.books.get(symbol)
+
+        if book is None:
+            check_symbols((symbol,))
+            book = self.books[symbol] = engine.init_book()
+
+        return book
+
+    #####
+    # This method processes a batch of orders with the ORDER_DTYPE layout. The
+    # orders of each symbol go to its book in the order they appear in the batch.
+    # Nothing is printed. The method returns the fills (with the FILL_DTYPE layout,
+    # grouped by symbol), one engine status code per order in the order of the
+    # batch, and a top-of-book update for every symbol in the batch.
+    #####
+    def process_orders(self, orders):
+        status = np.empty(len(orders), dtype=np.int8)
+        fills = []
+        symbols, order, bounds = _group(orders["symbol"])
+        fields = list(batch.ORDER_DTYPE.names)
+
+        for i, symbol in enumerate(symbols.tolist()):
+            positions = order[bounds[i]:bounds[i + 1]]
+            symbol_fills, status[positions] = batch.process_orders(self.get(symbol), orders[positions][fields])
+
+            if len(symbol_fills):
+                tagged = np.empty(len(symbol_fills), dtype=FILL_DTYPE)
+                tagged["symbol"] = symbol
+
+                for name in batch.FILL_DTYPE.names:
+                    tagged[name] = symbol_fills[name]
+
+                fills.append(tagged)
+
+        fills = np.concatenate(fills) if fills else np.empty(0, dtype=FILL_DTYPE)
+        return fills, status, self.top_of_book(symbols.tolist())
+
+    #####
+    # This method returns a top-of-book update for each of the given symbols (every
+    # symbol with a book if none are given) with the TOP_DTYPE layout.
+    #####
+    def top_of_book(self, symbols=None):
+        if symbols is None:
+            symbols = list(self.books)
+
+        top = np.zeros(len(symbols), dtype=TOP_DTYPE)
+
+        for i, symbol in enumerate(symbols):
+            book = self.get(symbol)
+            bid = engine.best_bid(book)
+            ask = engine.best_ask(book)
+            top[i]["symbol"] = symbol
+            top[i]["version"] = engine.book_version(book)
+
+            if bid is not None:
+                top[i]["bid"] = bid
+                top[i]["bid_qty"] = book.bids.levels[bid].volume
+
+            if ask is not None:
+                top[i]["ask"] = ask
+                top[i]["ask_qty"] = book.asks.levels[ask].volume
+
+        return top
+
+    def clear_market(self, symbols=None):
+        if symbols is None:
+            symbols = list(self.books)
+
+        return {symbol : engine.clear_market(self.get(symbol)) for symbol in symbols}
+
+#####
+# This function runs in each worker process of a router. It keeps a book manager
+# for the symbols of its shard and carries out the requests that arrive on its end
+# of the pipe, one at a time, sending back the result (or the exception).
+#####
+def _run_shard(conn):
+    manager = BookManager()
+
+    while True:
+        request = conn.recv()
+
+        if request is None:
+            break
+
+        name, args = request
+
+        try:
+            conn.send((True, getattr(manager, name)(*args)))
+        except Exception as e:
+            conn.send((False, e))
+
+    conn.close()
+
+#####
+# This function returns the shard of every symbol in symbols. A symbol always
+# lands on the same shard, in every process and every run, because it is hashed
+# with CRC-32 rather than with Python's salted hash.
+#####
+def shard_of(symbols, shards):
+    uniques, inverse = np.unique(np.asarray(symbols), return_inverse=True)
+    hashes = np.array([zlib.crc32(symbol.encode()) % shards for symbol in uniques.tolist()], dtype=np.int64)
+    return hashes[inverse.reshape(-1)]
+
+#####
+# A router shards the symbols over a pool of worker processes (one per core
+# unless told otherwise), each holding the books of its own symbols. A batch of
+# orders is split by shard and every piece is sent off before any result is
+# waited for, so the shards match their orders at the same time. The router
+# collects the fills and keeps the latest top-of-book update of every symbol it
+# has seen. A router should be closed when it is no longer needed, which the with
+# statement does.
+#####
+class Router:
+    def __init__(self, workers=None):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+
+        self.conns = []
+        self.processes = []
+        self.top = {}
+
+        for _ in range(workers):
+            conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_run_shard, args=(child_conn,), daemon=True)
+            process.start()
+            child_conn.close()
+            self.conns.append(conn)
+            self.processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for conn, process in zip(self.conns, self.processes):
+            conn.send(None)
+            conn.close()
+            process.join()
+
+        self.conns = []
+        self.processes = []
+
+    # reads the reply of every given connection before raising the first error, so that no reply is left
+    # behind in a pipe to be mistaken for the reply to a later request
+    def _receive(self, conns):
+        replies = [conn.recv() for conn in conns]
+
+        for ok, result in replies:
+            if not ok:
+                raise result
+
+        return [result for _, result in replies]
+
+    def _broadcast(self, name, *args):
+        for conn in self.conns:
+            conn.send((name, args))
+
+        return self._receive(self.conns)
+
+    #####
+    # This method processes a batch of orders with the ORDER_DTYPE layout across
+    # the shards. It returns the fills (grouped by symbol), one engine status code
+    # per order in the order of the batch, and the top-of-book updates of the
+    # symbols in the batch.
+    #####
+    def process_orders(self, orders):
+        shards = shard_of(orders["symbol"], len(self.conns)) if len(orders) else np.empty(0, dtype=np.int64)
+        sent = []
+
+        for shard, conn in enumerate(self.conns):
+            positions = np.flatnonzero(shards == shard)
+
+            if len(positions):
+                conn.send(("process_orders", (orders[positions],)))
+                sent.append((conn, positions))
+
+        status = np.empty(len(orders), dtype=np.int8)
+        fills = []
+        tops = []
+
+        for (_, positions), (shard_fills, shard_status, top) in zip(sent, self._receive([conn for conn, _ in sent])):
+            status[positions] = shard_status
+            fills.append(shard_fills)
+            tops.append(top)
+
+        fills = np.concatenate(fills) if fills else np.empty(0, dtype=FILL_DTYPE)
+        top = np.concatenate(tops) if tops else np.empty(0, dtype=TOP_DTYPE)
+
+        for update in top.tolist():
+            self.top[update[0]] = update
+
+        return fills, status, top
+
+    # returns the top of book of every symbol in every shard
+    def top_of_book(self):
+        return np.concatenate(self._broadcast("top_of_book"))
+
+    # clears the market of every symbol in every shard and returns the equilibrium price of each
+    def clear_market(self):
+        prices = {}
+
+        for shard_prices in self._broadcast("clear_market"):
+            prices.update(shard_prices)
+
+        return prices
+
+#####
+# The router is used from the command line to simulate many instruments at once,
+# for example:
+#
+#     python multibook.py --symbols 500 --orders 1000000 --workers 4
+#
+# The orders are sent in batches and the aggregate throughput is printed at the end.
+#####
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate many limit order books sharded across worker processes.")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--batch", type=int, default=50000, help="orders sent to the shards at a time")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--max-qty", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=123)
+    args = parser.parse_args()
+
+    symbols = ["S{:04d}".format(i) for i in range(args.symbols)]
+    orders = gen_orders(args.orders, symbols, seed=args.seed, max_qty=args.max_qty)
+    n_fills = 0
+
+    with Router(args.workers) as router:
+        start = time.perf_counter()
+
+        for i in range(0, len(orders), args.batch):
+            fills, status, top = router.process_orders(orders[i:i + args.batch])
+            n_fills += len(fills)
+
+        elapsed = time.perf_counter() - start
+        workers = len(router.conns)
+
+    print("{:,} orders over {:,} symbols on {} workers: {:,.0f} orders/s, {:,} fills".format(
+        len(orders), len(symbols), workers, len(orders) / elapsed, n_fills))
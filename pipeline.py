@@ -0,0 +1,242 @@
+import argparse
+import os
+import time
+from collections import deque, namedtuple
+import numpy as np
+import batch
+import analytics
+import engine
+from ingest import ChunkWriter
+
+# SIMULATION PIPELINE #
+
+#####
+# A simulation is a pipeline of generators: a source yields chunks of orders
+# (structured arrays with the batch.ORDER_DTYPE layout), simulate runs each chunk
+# through the engine and yields what happened as a Step, and run hands every step
+# to a list of sinks. Only one chunk is ever held in memory, nothing is printed
+# along the way, and a sink writes its output to disk a chunk at a time.
+#
+# A step holds the orders of the chunk, the engine status of each order, the
+# bid-ask spread in ticks after each order (-1 where there is none), the fills of
+# the chunk (FILL_DTYPE), the number of orders processed so far including this
+# chunk, and the book as it stands at the end of the chunk.
+#####
+Step = namedtuple("Step", ["orders", "status", "spreads", "fills", "processed", "book"])
+
+#####
+# This source yields n randomly generated orders (following the rules of
+# gen_orders) in chunks of chunk_size, all drawn from one seed.
+#####
+def random_orders(n, chunk_size=100000, seed=None, max_qty=1):
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, n, chunk_size):
+        yield batch.gen_orders(min(chunk_size, n - start), seed=rng, start=start + 1, max_qty=max_qty)
+
+#####
+# This source yields the orders of an existing array in chunks of chunk_size.
+#####
+def array_orders(orders, chunk_size=100000):
+    for start in range(0, len(orders), chunk_size):
+        yield orders[start:start + chunk_size]
+
+#####
+# This generator runs the chunks of a source through a book (an empty one unless a
+# book is given) and yields a Step for each chunk. Left alone, the resting orders
+# of a long random simulation pile up on the far side of each band, so the book
+# would keep growing. If max_age is given, a limit order that is still resting
+# once max_age more orders have arrived is cancelled, as if it expired, which
+# keeps the size of the book (and so the memory of the whole run) bounded.
+#####
+def simulate(source, book=None, max_age=None):
+    if book is None:
+        book = engine.init_book()
+
+    submit_order = engine.submit_order
+    cancel_order = engine.cancel_order
+    spread = engine.spread
+    resting = deque()
+    processed = 0
+
+    for orders in source:
+        status = []
+        spreads = []
+        fills = []
+
+        for order_id, order_time, order_type, side, price, qty in orders.tolist():
+            if max_age is not None:
+                # orders that arrived max_age orders ago expire
+                while resting and resting[0][0] <= processed - max_age:
+                    cancel_order(book, resting.popleft()[1])
+
+                if order_type == engine.LIMIT:
+                    resting.append((processed, order_id))
+
+            status.append(submit_order(book, order_type, side, price, qty, order_time, order_id, fills))
+            s = spread(book)
+            spreads.append(-1 if s is None else s)
+            processed += 1
+
+        yield Step(orders, np.array(status, dtype=np.int8), np.array(spreads, dtype=np.int32),
+                   np.array(fills, dtype=batch.FILL_DTYPE), processed, book)
+
+#####
+# A sink takes every step of a simulation and is closed once the simulation is
+# over. These sinks write their series to a CSV or Parquet file (picked by the
+# extension of the path) one chunk at a time.
+#####
+SPREAD_DTYPE = np.dtype([("order_id", np.int64),
+                         ("time", np.int64),
+                         ("status", np.int8),
+                         ("spread", np.int32)])
+
+class SpreadSink:
+    def __init__(self, path):
+        self.writer = ChunkWriter(path)
+
+    def write(self, step):
+        rows = np.empty(len(step.orders), dtype=SPREAD_DTYPE)
+        rows["order_id"] = step.orders["order_id"]
+        rows["time"] = step.orders["time"]
+        rows["status"] = step.status
+        rows["spread"] = step.spreads
+        self.writer.write(rows)
+
+    def close(self):
+        self.writer.close()
+
+class FillSink:
+    def __init__(self, path):
+        self.writer = ChunkWriter(path)
+
+    def write(self, step):
+        if len(step.fills):
+            self.writer.write(step.fills)
+
+    def close(self):
+        self.writer.close()
+
+#####
+# This sink writes the top levels price levels of each side of the book after
+# every every_chunks chunks, one row per level, tagged with the number of orders
+# processed when it was taken. Side is 1 for bids and -1 for asks and level counts
+# from 0 at the best price.
+#####
+DEPTH_DTYPE = np.dtype([("processed", np.int64),
+                        ("side", np.int8),
+                        ("level", np.int16),
+                        ("price", np.int32),
+                        ("shares", np.int64),
+                        ("orders", np.int32)])
+
+class DepthSink:
+    def __init__(self, path, levels=engine.DEPTH_LEVELS, every_chunks=1):
+        self.writer = ChunkWriter(path)
+        self.levels = levels
+        self.every_chunks = every_chunks
+        self.chunks = 0
+
+    def write(self, step):
+        self.chunks += 1
+
+        if self.chunks % self.every_chunks:
+            return
+
+        rows = [(step.processed, book_side.side, level, price, shares, count)
+                for book_side in (step.book.bids, step.book.asks)
+                for level, (price, shares, count) in enumerate(engine.get_depth(book_side, self.levels))]
+
+        if rows:
+            self.writer.write(np.array(rows, dtype=DEPTH_DTYPE))
+
+    def close(self):
+        self.writer.close()
+
+#####
+# This sink writes the market quality statistics kept by the analytics of the
+# book (see analytics.py) after every chunk, one row per chunk, tagged with the
+# number of orders processed. A statistic that is not defined yet is written as NaN.
+#####
+ANALYTICS_DTYPE = np.dtype([("processed", np.int64),
+                            ("trades", np.int64),
+                            ("volume", np.int64),
+                            ("vwap", np.float64),
+                            ("effective_spread", np.float64),
+                            ("realized_spread", np.float64),
+                            ("ofi", np.int64),
+                            ("ofi_window", np.int64),
+                            ("depth_imbalance", np.float64),
+                            ("mid", np.float64),
+                            ("volatility", np.float64)])
+
+class AnalyticsSink:
+    def __init__(self, path, book_analytics):
+        self.writer = ChunkWriter(path)
+        self.analytics = book_analytics
+
+    def write(self, step):
+        snapshot = self.analytics.snapshot()
+        snapshot["processed"] = step.processed
+        row = tuple(np.nan if snapshot[name] is None else snapshot[name] for name in ANALYTICS_DTYPE.names)
+        self.writer.write(np.array([row], dtype=ANALYTICS_DTYPE))
+
+    def close(self):
+        self.writer.close()
+
+#####
+# This function runs a simulation from a source into the given sinks and closes
+# them at the end (even if the simulation fails). It returns the last step, or
+# None if the source was empty.
+#####
+def run(source, sinks, book=None, max_age=None):
+    step = None
+
+    try:
+        for step in simulate(source, book, max_age):
+            for sink in sinks:
+                sink.write(step)
+    finally:
+        for sink in sinks:
+            sink.close()
+
+    return step
+
+#####
+# The pipeline is run from the command line, for example:
+#
+#     python pipeline.py --orders 100000000 --max-age 10000 --output run
+#
+# which writes spreads.parquet, fills.parquet and depth.parquet to the run folder
+# (--format csv writes CSV files instead), along with analytics.parquet if the
+# --analytics option is given (which slows the run down). Only a one-line summary
+# is printed, once the run is over.
+#####
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a long limit order book simulation to disk.")
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--max-qty", type=int, default=1)
+    parser.add_argument("--max-age", type=int, default=10000, help="orders after which a resting limit order expires (0 to never expire)")
+    parser.add_argument("--depth-levels", type=int, default=engine.DEPTH_LEVELS)
+    parser.add_argument("--depth-every", type=int, default=1, help="chunks between two depth snapshots")
+    parser.add_argument("--analytics", action="store_true", help="keep market quality statistics (see analytics.py)")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--output", default="run")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    path = lambda name: os.path.join(args.output, name + "." + args.format)
+    sinks = [SpreadSink(path("spreads")), FillSink(path("fills")), DepthSink(path("depth"), args.depth_levels, args.depth_every)]
+    book = engine.init_book()
+
+    if args.analytics:
+        sinks.append(AnalyticsSink(path("analytics"), analytics.attach_analytics(book)))
+
+    start = time.perf_counter()
+    step = run(random_orders(args.orders, args.chunk_size, args.seed, args.max_qty), sinks, book, args.max_age or None)
+    elapsed = time.perf_counter() - start
+
+    print("{:,} orders in {:.1f}s ({:,.0f} orders/s), {:,} orders resting at the end, output in {}".format(
+        step.processed if step else 0, elapsed, (step.processed if step else 0) / elapsed, len(step.book.orders) if step else 0, args.output))
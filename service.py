@@ -0,0 +1,309 @@
+import argparse
+import os
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+from multiprocessing.managers import BaseManager
+import analytics
+import engine
+
+# BOOK SERVICE #
+
+#####
+# A view is a read-only picture of a book at one point in time: its version, the
+# bid-ask spread in ticks (None if there is none), and the top price levels of
+# each side as (price in ticks, shares, number of orders) tuples. The version is a
+# (generation, book version) pair, where the generation goes up every time the book
+# is reset. A new view is built after every batch of changes and swapped in whole,
+# so readers can hold on to a view for as long as they like without ever seeing a
+# half-applied change and without holding up the writer.
+#####
+BookView = namedtuple("BookView", ["version", "spread", "bids", "asks"])
+
+#####
+# A book service owns one book and is the only thing allowed to change it. Every
+# request is put on a queue and carried out by a single writer thread, which takes
+# everything that is waiting on the queue as one batch and publishes a new view
+# once the batch is done. Callers block until their own request has been carried
+# out and get its result back (or its exception raised). The service also keeps
+# the order that is waiting to be processed on the book (the randomly generated
+# order shown on the site), so that every web worker shows and processes the same
+# one, and its order ID is taken from the book.
+#####
+class BookService:
+    def __init__(self, book=None):
+        self.book = engine.init_book() if book is None else book
+        self.generation = 0
+        self.pending = None
+        self.requests = queue.Queue()
+        self.changed = threading.Condition()
+        self.current_view = self._build_view()
+        self.writer = threading.Thread(target=self._run, daemon=True)
+        self.writer.start()
+
+    def _build_view(self):
+        return BookView((self.generation, engine.book_version(self.book)),
+                        engine.spread(self.book),
+                        tuple(engine.get_depth(self.book.bids)),
+                        tuple(engine.get_depth(self.book.asks)))
+
+    def _run(self):
+        while True:
+            batch = [self.requests.get()]
+
+            # everything else that is already waiting goes into the same batch
+            while True:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            for func, args, future in batch:
+                try:
+                    result = func(*args)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+
+            view = self._build_view()
+
+            if view.version != self.current_view.version:
+                with self.changed:
+                    self.current_view = view
+                    self.changed.notify_all()
+
+    def _request(self, func, *args):
+        future = Future()
+        self.requests.put((func, args, future))
+        return future.result()
+
+    def _submit(self, order_type, side, price, qty, time, order_id):
+        fills = []
+        status = engine.submit_order(self.book, order_type, side, price, qty, time, order_id, fills)
+        return status, fills
+
+    def _replace(self, order_id, price, qty, time):
+        fills = []
+        status = engine.replace_order(self.book, order_id, price, qty, time, fills)
+        return status, fills
+
+    def _reset(self, book):
+        if book is None:
+            book = engine.init_book()
+
+        # metrics count from the moment they were attached, so they carry over to the new book
+        if book.metrics is None:
+            book.metrics = self.book.metrics
+
+        # analytics describe one book, so the new book starts over with analytics of its own
+        old = analytics.find_analytics(self.book)
+
+        if old is not None and analytics.find_analytics(book) is None:
+            analytics.attach_analytics(book, old.window, old.horizon)
+
+        self.book = book
+        self.generation += 1
+
+    def _call(self, func, args):
+        result = func(self.book, *args)
+
+        # the book itself never leaves the writer thread
+        return None if result is self.book else result
+
+    def _read(self, func, args):
+        return (self.generation, engine.book_version(self.book)), self._call(func, args)
+
+    def _pending_order(self, gen_order):
+        if self.pending is None:
+            self.pending = gen_order(engine.next_order_id(self.book))
+
+        return self.pending
+
+    def _process_pending_order(self, process_order, gen_order):
+        process_order(self.book, self._pending_order(gen_order))
+        self.pending = gen_order(engine.next_order_id(self.book))
+
+    # submits an order to the book and returns its status and fills
+    def submit_order(self, order_type, side, price, qty, time, order_id=None):
+        return self._request(self._submit, order_type, side, price, qty, time, order_id)
+
+    # cancels a resting order and returns the status of the cancel
+    def cancel_order(self, order_id):
+        return self._request(self._call, engine.cancel_order, (order_id,))
+
+    # replaces the price and/or the quantity of a resting order and returns its status and fills
+    def replace_order(self, order_id, price, qty, time):
+        return self._request(self._replace, order_id, price, qty, time)
+
+    # swaps in a new book (an empty one unless a book is given)
+    def reset(self, book=None):
+        return self._request(self._reset, book)
+
+    # runs func(book, *args) on the writer thread, in turn with every other request, and returns the result
+    # (a function that hands back the book, like process_order in backend.py, returns None instead)
+    def call(self, func, *args):
+        return self._request(self._call, func, args)
+
+    # runs func(book, *args) like call and returns the version of the book it ran on along with the result
+    def read(self, func, *args):
+        return self._request(self._read, func, args)
+
+    # returns the order waiting to be processed on the book, made by gen_order(order_id) (like gen_order in
+    # backend.py) with the next order ID of the book if there is none yet
+    def pending_order(self, gen_order):
+        return self._request(self._pending_order, gen_order)
+
+    # processes the waiting order with process_order(book, order) and makes the next one with gen_order
+    def process_pending_order(self, process_order, gen_order):
+        return self._request(self._process_pending_order, process_order, gen_order)
+
+    # returns the latest view of the book without waiting for the writer
+    def view(self):
+        return self.current_view
+
+    # waits until the version of the book is no longer the given version (or the timeout runs out)
+    # and returns the latest view
+    def wait_for_change(self, version, timeout=None):
+        with self.changed:
+            self.changed.wait_for(lambda: tuple(self.current_view.version) != tuple(version), timeout)
+            return self.current_view
+
+#####
+# This exception is raised when a registry is asked for a new book but already
+# holds as many books as it may.
+#####
+class TooManyBooks(Exception):
+    pass
+
+#####
+# A registry of named book services, for example one per instrument or one per
+# user session. A book service is started the first time its name is asked for,
+# with the book returned by factory(name) if a factory is given. Every book
+# service keeps a writer thread and its book for as long as the registry lives,
+# so at most max_books of them are started (any number if max_books is None).
+#####
+class BookRegistry:
+    def __init__(self, factory=None, max_books=None):
+        self.factory = factory
+        self.max_books = max_books
+        self.services = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        with self.lock:
+            if name not in self.services:
+                if self.max_books is not None and len(self.services) >= self.max_books:
+                    raise TooManyBooks("there are already " + str(len(self.services)) + " books")
+
+                book = None if self.factory is None else self.factory(name)
+                self.services[name] = BookService(book)
+
+            return self.services[name]
+
+    def names(self):
+        with self.lock:
+            return list(self.services)
+
+#####
+# Every book is saved to a snapshot file of its own (see save_lob in backend.py),
+# all in one folder: lob.snapshot for the default book and lob-<name>.snapshot for
+# every other book. load_book loads a book back from its snapshot file, or returns
+# an empty book if it was never saved, so that a restarted server picks up where
+# it left off.
+#####
+DEFAULT_BOOK = "default"
+
+def snapshot_path(directory, name):
+    if name == DEFAULT_BOOK:
+        return os.path.join(directory, "lob.snapshot")
+
+    return os.path.join(directory, "lob-" + name + ".snapshot")
+
+def load_book(directory, name):
+    path = snapshot_path(directory, name)
+
+    if not os.path.exists(path):
+        return engine.init_book()
+
+    import snapshot
+    return snapshot.load_snapshot(path)
+
+#####
+# When the web tier runs several worker processes, each process would otherwise
+# keep its own book. Instead, one process runs serve, which keeps the registry and
+# its writer threads, and every worker calls connect to get a registry whose
+# books live in that one process. The books are used through the same methods as
+# a local BookService, and the functions passed to call have to be importable by
+# the serving process.
+#####
+class BookManager(BaseManager):
+    pass
+
+_registry = None
+
+def _get_registry():
+    return _registry
+
+BookManager.register("BookService", create_method=False,
+                     exposed=("submit_order", "cancel_order", "replace_order", "reset", "call", "read", "pending_order",
+                              "process_pending_order", "view", "wait_for_change"))
+BookManager.register("registry", callable=_get_registry, exposed=("get", "names"), method_to_typeid={"get" : "BookService"})
+
+#####
+# This function serves a registry of books at the given (host, port) address until
+# the process is stopped. Only clients that know the authkey can connect.
+#####
+def serve(address, authkey, factory=None, max_books=None):
+    global _registry
+    _registry = BookRegistry(factory, max_books)
+    BookManager(address=address, authkey=authkey).get_server().serve_forever()
+
+#####
+# This function connects to a registry that is being served at the given address
+# and returns it. Its get method hands back the book service with the given name.
+#####
+def connect(address, authkey):
+    manager = BookManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.registry()
+
+#####
+# The book server is started from the command line, for example:
+#
+#     python service.py --host 127.0.0.1 --port 5001 --authkey secret
+#
+# and the web workers are then pointed at it (see frontend.py). The books are
+# loaded from the snapshot files in --snapshot-dir, which has to be the folder the
+# web workers save them to (LOB_SNAPSHOT_DIR in frontend.py, both of which are the
+# folder of the code unless they are set).
+#####
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve limit order books to several worker processes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--authkey", required=True)
+    parser.add_argument("--metrics", action="store_true", help="attach metrics to every book (see metrics.py)")
+    parser.add_argument("--analytics", action="store_true", help="keep market quality statistics for every book (see analytics.py)")
+    parser.add_argument("--max-books", type=int, default=64, help="most books that can be opened (0 for any number)")
+    parser.add_argument("--snapshot-dir", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="folder the books are loaded from (the folder the web workers save them to)")
+    args = parser.parse_args()
+
+    # the views are sent to the clients as service.BookView, not __main__.BookView
+    import service
+    import metrics
+
+    def factory(name):
+        book = service.load_book(args.snapshot_dir, name)
+
+        if args.metrics:
+            metrics.attach_metrics(book)
+
+        if args.analytics:
+            analytics.attach_analytics(book)
+
+        return book
+
+    service.serve((args.host, args.port), args.authkey.encode(), factory, args.max_books or None)
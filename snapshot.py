@@ -0,0 +1,79 @@
+import os
+import struct
+import numpy as np
+import engine
+
+# SNAPSHOT #
+
+#####
+# A snapshot file starts with the MAGIC header, whose last byte is the format
+# version, followed by a HEADER with the next free order ID of the book and the
+# number of resting orders. The resting orders come after that as fixed-width
+# records with the RECORD_DTYPE layout, in priority order: the bid side from the
+# best price down, then the ask side from the best price up, with the orders at
+# each price in the order they arrived. Prices are in ticks, and time stamps are
+# the integer nanoseconds the book keeps.
+#####
+MAGIC = b"LOBSNAP\x01"
+
+HEADER = struct.Struct("<qq")
+
+RECORD_DTYPE = np.dtype([("order_id", np.int64),
+                         ("time", np.int64),
+                         ("side", np.int8),
+                         ("pad", np.int8, 3),
+                         ("price", np.int32),
+                         ("qty", np.int32)])
+
+#####
+# This function saves a book to a snapshot file, time stamps and all, so that
+# loading it gives back exactly the same book. The snapshot is written to a
+# temporary file first and then moved into place, so a crash while saving never
+# leaves a half-written snapshot behind.
+#####
+def save_snapshot(book, path):
+    orders = [order for book_side in (book.bids, book.asks) for order in engine.iter_orders(book_side)]
+    records = np.zeros(len(orders), dtype=RECORD_DTYPE)
+
+    if orders:
+        records["order_id"] = [order.order_id for order in orders]
+        records["time"] = [order.time for order in orders]
+        records["side"] = [order.side for order in orders]
+        records["price"] = [order.price for order in orders]
+        records["qty"] = [order.qty for order in orders]
+
+    temp_path = path + ".tmp"
+
+    with open(temp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(book.next_id, len(records)))
+        records.tofile(f)
+
+    os.replace(temp_path, path)
+
+#####
+# This function loads a book from a snapshot file. The records are memory-mapped
+# rather than read, and the resting orders are put straight back on their price
+# levels without going through the matching logic, so the cost of loading only
+# depends on how many orders are resting. This function returns the loaded book.
+#####
+def load_snapshot(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + " is not a snapshot or was written by another version")
+
+        next_id, count = HEADER.unpack(f.read(HEADER.size))
+
+    book = engine.init_book()
+    book.next_id = next_id
+
+    if count == 0:
+        return book
+
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=len(MAGIC) + HEADER.size, shape=(count,))
+    restore_order = engine.restore_order
+
+    for order_id, time, side, _, price, qty in records.tolist():
+        restore_order(book, order_id, side, price, qty, time)
+
+    return book
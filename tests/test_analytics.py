@@ -0,0 +1,58 @@
+import math
+import pytest
+import analytics
+import engine
+
+def test_hand_computed_statistics():
+    book = engine.init_book()
+    stats = analytics.attach_analytics(book, window=100, horizon=2)
+
+    # bid 100x5 / ask 102x5: the mid is 101 and the two quotes cancel out in the order-flow imbalance
+    engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 5, 1)
+    engine.submit_order(book, engine.LIMIT, engine.SELL, 102, 5, 2)
+    snapshot = stats.snapshot()
+    assert (snapshot["mid"], snapshot["ofi"], snapshot["depth_imbalance"]) == (101.0, 0, 0.0)
+    assert snapshot["vwap"] is None and snapshot["effective_spread"] is None and snapshot["volatility"] is None
+
+    # a market buy of 2 takes 2 shares off the ask at 102, which is 2 shares of buying pressure
+    engine.submit_order(book, engine.MARKET, engine.BUY, 0, 2, 3)
+    snapshot = stats.snapshot()
+    assert (snapshot["trades"], snapshot["volume"], snapshot["vwap"]) == (1, 2, 102.0)
+    assert snapshot["effective_spread"] == 2 * (102 - 101)
+    assert snapshot["ofi"] == 2
+    assert snapshot["depth_imbalance"] == (5 - 3) / (5 + 3)
+    assert snapshot["realized_spread"] is None
+
+    # a new ask at 101 is the second quote update after the trade, so the trade is marked against the mid of 100.5
+    engine.submit_order(book, engine.LIMIT, engine.SELL, 101, 1, 4)
+    snapshot = stats.snapshot()
+    assert snapshot["mid"] == 100.5
+    assert snapshot["realized_spread"] == 2 * (102 - 100.5)
+    assert snapshot["ofi"] == 2 - 1
+    assert snapshot["depth_imbalance"] == (5 - 1) / (5 + 1)
+
+    # the mid went 101 -> 101 -> 100.5, and the volatility is the sample standard deviation of the log returns
+    change = math.log(100.5 / 101)
+    assert snapshot["volatility"] == pytest.approx(math.sqrt(((0 - change / 2) ** 2 + (change - change / 2) ** 2) / 1))
+
+def test_rolling_window():
+    book = engine.init_book()
+    stats = analytics.attach_analytics(book, window=1)
+    engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 5, 1)
+    engine.submit_order(book, engine.LIMIT, engine.SELL, 102, 5, 2)
+    engine.submit_order(book, engine.MARKET, engine.BUY, 0, 2, 3)
+    engine.submit_order(book, engine.LIMIT, engine.SELL, 101, 1, 4)
+
+    # only the last quote update counts
+    assert stats.snapshot()["ofi"] == 1
+    assert stats.snapshot()["ofi_window"] == -1
+
+def test_find_and_detach():
+    book = engine.init_book()
+    assert analytics.read_analytics(book) is None
+
+    stats = analytics.attach_analytics(book)
+    assert analytics.find_analytics(book) is stats
+
+    analytics.detach_analytics(book)
+    assert analytics.read_analytics(book) is None
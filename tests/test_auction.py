@@ -0,0 +1,107 @@
+import random
+import pytest
+import auction
+import engine
+
+def crossed_book(orders):
+    book = engine.init_book()
+    engine.set_auction_mode(book, True)
+
+    for side, price, qty in orders:
+        engine.submit_order(book, engine.LIMIT, side, price, qty, 0)
+
+    return book
+
+def resting(book):
+    return [(order.order_id, order.price, order.qty)
+            for book_side in (book.bids, book.asks) for order in engine.iter_orders(book_side)]
+
+# tries every price in the book between the best ask and the best bid, with the same tie-breaking rules
+def brute_force_clearing_price(orders):
+    bids = [(price, qty) for side, price, qty in orders if side == engine.BUY]
+    asks = [(price, qty) for side, price, qty in orders if side == engine.SELL]
+
+    if not bids or not asks or max(bids)[0] < min(asks)[0]:
+        return None, 0
+
+    best = []
+
+    for price in sorted({price for _, price, _ in orders}):
+        if min(asks)[0] <= price <= max(bids)[0]:
+            demand = sum(qty for bid, qty in bids if bid >= price)
+            supply = sum(qty for ask, qty in asks if ask <= price)
+            best.append((-min(demand, supply), abs(demand - supply), price))
+
+    best.sort()
+    candidates = [price for volume, imbalance, price in best if (volume, imbalance) == best[0][:2]]
+    return candidates[(len(candidates) - 1) // 2], -best[0][0]
+
+# takes volume shares off one side in priority order and returns the shares taken from each order
+def brute_force_take(book_side, volume):
+    taken = {}
+
+    for order in engine.iter_orders(book_side):
+        if volume == 0:
+            break
+
+        taken[order.order_id] = min(order.qty, volume)
+        volume -= taken[order.order_id]
+
+    return taken
+
+@pytest.mark.parametrize("seed", range(4))
+def test_uncross_matches_brute_force(seed):
+    rnd = random.Random(seed)
+
+    for _ in range(75):
+        orders = [(rnd.choice((engine.BUY, engine.SELL)), rnd.randint(95, 105), rnd.randint(1, 9))
+                  for _ in range(rnd.randint(1, 30))]
+        book = crossed_book(orders)
+        price, volume = brute_force_clearing_price(orders)
+        assert auction.clearing_price(book) == (price, volume)
+
+        bought = brute_force_take(book.bids, volume)
+        sold = brute_force_take(book.asks, volume)
+        clearing, traded, fills = auction.uncross(book, 7)
+
+        if price is None:
+            assert (clearing, traded, len(fills)) == (None, 0, 0)
+            continue
+
+        assert (clearing, traded) == (engine.to_price(price), volume)
+        assert (fills["price"] == price).all() and (fills["time"] == 7).all()
+
+        # the buyers and the sellers are each used up in priority order, one after the other
+        for ids, taken in ((fills["aggressor_id"].tolist(), bought), (fills["resting_id"].tolist(), sold)):
+            assert list(dict.fromkeys(ids)) == list(taken)
+            assert {order_id : int(fills["qty"][[i for i, j in enumerate(ids) if j == order_id]].sum())
+                    for order_id in taken} == taken
+
+        assert engine.spread(book) is None or engine.spread(book) > 0
+
+def test_clearing_price_ties():
+    # 5 shares trade at both 99 and 101 with nothing left over
+    book = crossed_book([(engine.BUY, 101, 5), (engine.SELL, 99, 5)])
+    assert auction.clearing_price(book) == (99, 5)
+
+    # 7 shares trade at both 100 and 101 with 3 left over on the bid side
+    book = crossed_book([(engine.BUY, 101, 5), (engine.BUY, 101, 5), (engine.SELL, 100, 7)])
+    assert auction.clearing_price(book) == (100, 7)
+
+    # 5 shares trade at both 100 and 102, with 3 left over at 100 and none at 102
+    book = crossed_book([(engine.BUY, 102, 5), (engine.BUY, 100, 3), (engine.SELL, 100, 5)])
+    assert auction.clearing_price(book) == (102, 5)
+
+    # the most shares win over everything else
+    book = crossed_book([(engine.BUY, 102, 4), (engine.SELL, 100, 3), (engine.SELL, 102, 5)])
+    assert auction.clearing_price(book) == (102, 4)
+
+def test_level_partly_filled_at_the_clearing_price():
+    book = crossed_book([(engine.BUY, 102, 4), (engine.SELL, 100, 3), (engine.SELL, 102, 5)])
+    price, volume, fills = auction.uncross(book)
+
+    assert (price, volume) == (1.02, 4)
+    assert fills[["aggressor_id", "resting_id", "price", "qty"]].tolist() == [(1, 2, 102, 3), (1, 3, 102, 1)]
+    assert resting(book) == [(3, 102, 4)]
+    assert engine.get_depth(book.asks) == [(102, 4, 1)]
+    assert engine.best_bid(book) is None
@@ -0,0 +1,76 @@
+import engine
+
+def resting(book):
+    return [(order.order_id, order.price, order.qty)
+            for book_side in (book.bids, book.asks) for order in engine.iter_orders(book_side)]
+
+def test_match_in_price_then_time_priority():
+    book = engine.init_book()
+    engine.submit_order(book, engine.LIMIT, engine.SELL, 101, 5, 1)
+    engine.submit_order(book, engine.LIMIT, engine.SELL, 100, 2, 2)
+    engine.submit_order(book, engine.LIMIT, engine.SELL, 100, 3, 3)
+    fills = []
+
+    status = engine.submit_order(book, engine.LIMIT, engine.BUY, 101, 6, 4, None, fills)
+
+    assert status == engine.FILLED
+    assert fills == [(4, 2, 100, 2, 4), (4, 3, 100, 3, 4), (4, 1, 101, 1, 4)]
+    assert resting(book) == [(1, 101, 4)]
+    assert engine.spread(book) is None
+
+def test_limit_rests_the_rest_and_market_does_not():
+    book = engine.init_book()
+    engine.submit_order(book, engine.LIMIT, engine.SELL, 100, 2, 1)
+
+    assert engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 5, 2) == engine.PARTIAL
+    assert resting(book) == [(2, 100, 3)]
+
+    assert engine.submit_order(book, engine.MARKET, engine.SELL, 0, 4, 3) == engine.PARTIAL
+    assert resting(book) == []
+    assert book.orders == {}
+
+def test_cancel():
+    book = engine.init_book()
+    engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 1, 1)
+    engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 2, 2)
+
+    assert engine.cancel_order(book, 1) == engine.CANCELLED
+    assert engine.cancel_order(book, 1) == engine.NOT_FOUND
+    assert resting(book) == [(2, 100, 2)]
+    assert engine.get_depth(book.bids) == [(100, 2, 1)]
+
+def test_replace_keeps_or_loses_priority():
+    book = engine.init_book()
+    engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 5, 1)
+    engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 5, 2)
+
+    # reducing an order at the same price keeps its place in the queue
+    assert engine.replace_order(book, 1, None, 3, 3) == engine.RESTED
+    assert resting(book) == [(1, 100, 3), (2, 100, 5)]
+
+    # adding shares sends it to the back
+    assert engine.replace_order(book, 1, None, 4, 4) == engine.RESTED
+    assert resting(book) == [(2, 100, 5), (1, 100, 4)]
+
+    # a new price that crosses the book trades straight away
+    engine.submit_order(book, engine.LIMIT, engine.SELL, 102, 2, 5)
+    fills = []
+    assert engine.replace_order(book, 2, 102, None, 6, fills) == engine.PARTIAL
+    assert fills == [(2, 3, 102, 2, 6)]
+    assert resting(book) == [(2, 102, 3), (1, 100, 4)]
+
+    assert engine.replace_order(book, 9, 100, 1, 7) == engine.NOT_FOUND
+
+def test_no_shares():
+    book = engine.init_book()
+
+    assert engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 0, 1) == engine.REJECTED
+    assert engine.submit_order(book, engine.LIMIT, engine.BUY, 100, -1, 1) == engine.REJECTED
+    assert book.next_id == 1
+
+    engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 5, 1)
+
+    # a replace with no shares is a cancel, even one that also changes the price
+    assert engine.replace_order(book, 1, 105, 0, 2) == engine.CANCELLED
+    assert resting(book) == []
+    assert engine.best_bid(book) is None
@@ -0,0 +1,77 @@
+import random
+import pytest
+import auction
+import engine
+import feed
+
+def book_state(book):
+    orders = {order.order_id : (order.side, order.price, order.qty)
+              for book_side in (book.bids, book.asks) for order in engine.iter_orders(book_side)}
+    levels = {book_side.side : {price : level.volume for price, level in book_side.levels.items() if level.volume}
+              for book_side in (book.bids, book.asks)}
+    return orders, levels
+
+def copy_state(copy):
+    return copy.orders, copy.levels
+
+@pytest.mark.parametrize("seed", range(4))
+def test_copies_stay_identical(seed):
+    rnd = random.Random(seed)
+    book = engine.init_book()
+    book_feed = feed.attach_feed(book, history=500, snapshot_interval=200)
+    live = feed.BookCopy()
+    book_feed.subscribe(live.apply)
+    lossy = feed.BookCopy()
+    gaps = []
+
+    # this consumer drops one message in a hundred and only sometimes catches up straight away
+    def receive(message):
+        if rnd.random() < 0.01:
+            return
+
+        if not lossy.apply(message):
+            gaps.append(message[0])
+
+            if rnd.random() < 0.5:
+                lossy.catch_up(book_feed, book)
+
+    book_feed.subscribe(receive)
+    ids = []
+
+    for i in range(4000):
+        r = rnd.random()
+
+        if r < 0.15 and ids:
+            engine.cancel_order(book, rnd.choice(ids))
+        elif r < 0.25 and ids:
+            engine.replace_order(book, rnd.choice(ids), rnd.choice([None, rnd.randint(7450, 7550)]),
+                                 rnd.choice([None, rnd.randint(0, 9)]), i)
+        elif r < 0.255:
+            engine.set_auction_mode(book, True)
+        elif r < 0.26 and book.auction:
+            engine.set_auction_mode(book, False)
+
+            if rnd.random() < 0.5:
+                auction.uncross(book, i)
+            else:
+                engine.clear_market(book)
+        else:
+            order_type = engine.MARKET if r < 0.35 else engine.LIMIT
+            engine.submit_order(book, order_type, rnd.choice((engine.BUY, engine.SELL)), rnd.randint(7450, 7550),
+                                rnd.randint(1, 9), i)
+            ids.append(book.next_id - 1)
+
+        if i % 250 == 0 and not book.auction:
+            assert copy_state(live) == book_state(book)
+
+    assert gaps
+    lossy.catch_up(book_feed, book)
+
+    assert copy_state(lossy) == book_state(book)
+    assert copy_state(live) == book_state(book)
+    assert lossy.seq == live.seq == book_feed.seq
+
+    # a consumer that joins late starts from the latest snapshot
+    late = feed.BookCopy()
+    late.catch_up(book_feed, book)
+    assert copy_state(late) == book_state(book)
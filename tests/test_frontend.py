@@ -0,0 +1,55 @@
+import numpy as np
+import backend
+import engine
+import frontend
+import service
+
+def test_restart_from_snapshot(tmp_path, monkeypatch):
+    path = service.snapshot_path(str(tmp_path), frontend.DEFAULT_BOOK)
+    book = engine.init_book()
+
+    # the saved book holds the IDs a new process would hand out first
+    for order_id in range(1, 21):
+        engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 1, backend.now_ns(), order_id)
+
+    backend.save_lob(book, path)
+
+    monkeypatch.setattr(frontend, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(frontend, "books", service.BookRegistry(frontend.load_book))
+    monkeypatch.setattr(frontend, "rendered", {})
+    np.random.seed(0)
+
+    client = frontend.app.test_client()
+    assert client.get("/").status_code == 200
+
+    for _ in range(10):
+        assert client.post("/", data={"submit_button" : "Process Order"}).status_code == 302
+
+    # every order was given the next ID of the restored book
+    assert frontend.books.get(frontend.DEFAULT_BOOK).pending_order(backend.gen_order)["Order ID"][0] == 31
+
+def test_book_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(frontend, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(frontend, "books", service.BookRegistry(frontend.load_book, 2))
+    monkeypatch.setattr(frontend, "rendered", {})
+
+    client = frontend.app.test_client()
+    assert client.get("/depth?book=a").status_code == 200
+    assert client.get("/depth?book=b").status_code == 200
+    assert client.get("/depth?book=c").status_code == 429
+    assert client.get("/?book=a").status_code == 200
+
+def test_depth_levels(tmp_path, monkeypatch):
+    monkeypatch.setattr(frontend, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(frontend, "books", service.BookRegistry(frontend.load_book))
+    book = frontend.books.get(frontend.DEFAULT_BOOK)
+
+    for price in range(100, 300):
+        book.submit_order(engine.LIMIT, engine.BUY, price, 1, 0)
+
+    client = frontend.app.test_client()
+    assert client.get("/depth?levels=-1").status_code == 400
+    assert client.get("/depth?levels=0").status_code == 400
+    assert client.get("/stream?levels=0").status_code == 400
+    assert len(client.get("/depth?levels=2").get_json()["bids"]) == 2
+    assert len(client.get("/depth?levels=1000000").get_json()["bids"]) == frontend.MAX_LEVELS
@@ -0,0 +1,43 @@
+import engine
+import gateway
+
+class Connection:
+    def __init__(self):
+        self.data = bytearray()
+
+    def is_closing(self):
+        return False
+
+    def write(self, data):
+        self.data += data
+
+def acks(connection):
+    messages, _ = gateway.decode(connection.data, (gateway.ACK, gateway.FILL))
+    return [message[3] for message in messages if message[0] == gateway.ACK]
+
+def test_invalid_orders_are_rejected():
+    gw = gateway.Gateway()
+    client = Connection()
+    gw.process([(gateway.NEW, 1, 1, engine.LIMIT, engine.BUY, 7000, 3)], client)
+
+    gw.process([(gateway.NEW, 2, 2, engine.LIMIT, 0, 9999, 1),
+                (gateway.NEW, 3, 3, engine.MARKET, 2, 0, 1),
+                (gateway.NEW, 4, 4, 5, engine.SELL, 7000, 1),
+                (gateway.NEW, 5, 5, engine.LIMIT, engine.SELL, 7000, 0),
+                (gateway.NEW, 6, 6, engine.LIMIT, engine.SELL, 0, 1),
+                (gateway.REPLACE, 7, 1, gateway.KEEP_PRICE, -3),
+                (gateway.REPLACE, 8, 1, -5, gateway.KEEP_QTY)], client)
+
+    assert acks(client) == [engine.RESTED] + [engine.REJECTED] * 7
+    assert gw.book.orders[1].qty == 3
+    assert gw.book.orders[1].price == 7000
+
+def test_valid_orders_still_trade():
+    gw = gateway.Gateway()
+    client = Connection()
+    gw.process([(gateway.NEW, 1, 1, engine.LIMIT, engine.BUY, 7000, 3),
+                (gateway.REPLACE, 2, 1, gateway.KEEP_PRICE, 2),
+                (gateway.NEW, 3, 2, engine.MARKET, engine.SELL, 0, 1)], client)
+
+    assert acks(client) == [engine.RESTED, engine.RESTED, engine.FILLED]
+    assert gw.book.orders[1].qty == 1
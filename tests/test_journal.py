@@ -0,0 +1,86 @@
+import random
+import pytest
+import auction
+import engine
+import journal
+
+def resting(book):
+    return [(order.order_id, order.side, order.price, order.qty, order.time)
+            for book_side in (book.bids, book.asks) for order in engine.iter_orders(book_side)]
+
+@pytest.mark.parametrize("seed", range(4))
+def test_replay_rebuilds_the_book(tmp_path, seed):
+    rnd = random.Random(seed)
+    path = str(tmp_path / "book.journal")
+    book = engine.init_book()
+    book_journal = journal.attach_journal(book, path)
+    ids = []
+    fills = []
+
+    for i in range(3000):
+        r = rnd.random()
+
+        if r < 0.15 and ids:
+            engine.cancel_order(book, rnd.choice(ids))
+        elif r < 0.25 and ids:
+            # a replace with 0 shares cancels the order
+            engine.replace_order(book, rnd.choice(ids), rnd.choice([None, rnd.randint(7450, 7550)]),
+                                 rnd.choice([None, rnd.randint(0, 9)]), i, fills)
+        elif r < 0.255 and not book.auction:
+            engine.set_auction_mode(book, True)
+        elif r < 0.265 and book.auction:
+            engine.set_auction_mode(book, False)
+
+            if rnd.random() < 0.5:
+                fills += auction.uncross(book, i)[2].tolist()
+            else:
+                engine.clear_market(book)
+        else:
+            order_type = engine.MARKET if r < 0.35 else engine.LIMIT
+            engine.submit_order(book, order_type, rnd.choice((engine.BUY, engine.SELL)), rnd.randint(7450, 7550),
+                                rnd.randint(1, 9), i, None, fills)
+            ids.append(book.next_id - 1)
+
+    book_journal.close()
+    replayed = journal.replay(path)
+
+    assert resting(replayed) == resting(book)
+    assert replayed.auction == book.auction
+    assert replayed.next_id == book.next_id
+
+    # every fill is recorded, in the order it happened
+    records = journal.read_journal(path)
+    recorded = records[records["kind"] == journal.FILL][["order_id", "resting_id", "price", "qty", "time"]]
+    assert recorded.tolist() == fills
+
+def test_partial_record_is_cut_off(tmp_path):
+    path = str(tmp_path / "book.journal")
+    book = engine.init_book()
+    book_journal = journal.attach_journal(book, path)
+    engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 5, 1)
+    engine.submit_order(book, engine.LIMIT, engine.SELL, 101, 5, 2)
+    book_journal.close()
+
+    # a crash in the middle of a record leaves part of it at the end of the file
+    with open(path, "ab") as f:
+        f.write(journal.RECORD.pack(journal.ORDER, engine.LIMIT, engine.BUY, 101, 5, 3, 0, 3)[:10])
+
+    assert len(journal.read_journal(path)) == 2
+    assert resting(journal.replay(path)) == resting(book)
+
+    # opening the journal again cuts the partial record off before anything is appended
+    replayed = journal.replay(path)
+    book_journal = journal.attach_journal(replayed, path)
+    engine.cancel_order(replayed, 1)
+    book_journal.close()
+
+    records = journal.read_journal(path)
+    assert records["kind"].tolist() == [journal.ORDER, journal.ORDER, journal.CANCEL]
+    assert resting(journal.replay(path)) == [(2, engine.SELL, 101, 5, 2)]
+
+def test_not_a_journal(tmp_path):
+    path = tmp_path / "other"
+    path.write_bytes(b"something else")
+
+    with pytest.raises(ValueError):
+        journal.read_journal(str(path))
@@ -0,0 +1,61 @@
+import random
+import pytest
+import engine
+import ladder
+
+@pytest.mark.parametrize("seed", range(6))
+def test_ladder_matches_engine(seed):
+    rnd = random.Random(seed)
+    book = engine.init_book()
+    lad = ladder.init_book(7000, 8100, capacity=4)
+    ids = []
+
+    # odd seeds spread the prices over the whole ladder, even seeds keep them close so they trade a lot,
+    # and the ladder starts small so that it has to grow along the way
+    for i in range(5000):
+        r = rnd.random()
+
+        if r < 0.25 and ids:
+            order_id = rnd.choice(ids)
+            assert engine.cancel_order(book, order_id) == ladder.cancel_order(lad, order_id)
+            continue
+
+        order_type = engine.MARKET if r < 0.33 else engine.LIMIT
+        side = rnd.choice((engine.BUY, engine.SELL))
+        price = rnd.randint(7000, 8100) if seed % 2 else rnd.randint(7480, 7520)
+        qty = rnd.randint(1, 9)
+        engine_fills = []
+        ladder_fills = []
+
+        status = engine.submit_order(book, order_type, side, price, qty, i, None, engine_fills)
+        assert ladder.submit_order(lad, order_type, side, price, qty, i, None, ladder_fills) == status
+        assert ladder_fills == engine_fills
+
+        if status in (engine.RESTED, engine.PARTIAL) and order_type == engine.LIMIT:
+            ids.append(book.next_id - 1)
+
+        assert ladder.spread(lad) == engine.spread(book)
+
+        if i % 250 == 0:
+            assert ladder.get_depth(lad, lad.bids, 50) == engine.get_depth(book.bids, 50)
+            assert ladder.get_depth(lad, lad.asks, 50) == engine.get_depth(book.asks, 50)
+
+    for engine_side, ladder_side in ((book.bids, lad.bids), (book.asks, lad.asks)):
+        assert list(ladder.iter_orders(lad, ladder_side)) == [(order.order_id, order.price, order.qty, order.time)
+                                                              for order in engine.iter_orders(engine_side)]
+
+    assert ladder.best_bid(lad) == engine.best_bid(book)
+    assert ladder.mid_price(lad) == engine.mid_price(book)
+
+def test_capacity():
+    with pytest.raises(ValueError):
+        ladder.init_book(capacity=0)
+
+    # a ladder with room for a single order grows as more orders come to rest
+    lad = ladder.init_book(capacity=1)
+
+    for price in range(7000, 7010):
+        assert ladder.submit_order(lad, engine.LIMIT, engine.BUY, price, 1, 0) == engine.RESTED
+
+    assert lad.capacity >= 10
+    assert ladder.get_depth(lad, lad.bids, 3) == [(7009, 1, 1), (7008, 1, 1), (7007, 1, 1)]
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+import engine
+import multibook
+
+def test_duplicate_ids_are_rejected():
+    orders = multibook.gen_orders(200, ["AAA", "BBB", "CCC"], seed=1)
+    orders["order_type"] = engine.LIMIT
+    orders["price"] = np.where(orders["side"] == engine.BUY, 7000, 8000)
+
+    with multibook.Router(2) as router:
+        router.process_orders(orders)
+        fills, status, _ = router.process_orders(orders[:5])
+        assert (status == engine.REJECTED).all()
+
+        # the next batch is answered with its own results
+        more = multibook.gen_orders(100, ["AAA", "BBB", "CCC"], seed=2)
+        more["order_id"] += 1000
+        fills, status, _ = router.process_orders(more)
+        assert len(status) == 100
+
+def test_errors_leave_no_replies_behind():
+    orders = multibook.gen_orders(100, ["AAA", "BBB", "CCC", "DDD"], seed=3)
+
+    with multibook.Router(2) as router:
+        with pytest.raises(AttributeError):
+            router._broadcast("no_such_method")
+
+        fills, status, top = router.process_orders(orders)
+        assert len(status) == 100
+        assert sorted(router.top_of_book()["symbol"].tolist()) == ["AAA", "BBB", "CCC", "DDD"]
+
+def test_symbols_that_do_not_fit_are_refused():
+    with pytest.raises(ValueError):
+        multibook.gen_orders(4, ["LONGTICKER1", "LONGTICKER2"])
+
+    with pytest.raises(ValueError):
+        multibook.BookManager().top_of_book(["LONGTICKER1"])
+
+    orders = multibook.gen_orders(4, ["EIGHTCHR"], seed=1)
+    assert set(orders["symbol"].tolist()) == {"EIGHTCHR"}
@@ -0,0 +1,88 @@
+import threading
+import time
+import pytest
+import backend
+import engine
+import service
+
+def test_pending_order_ids_come_from_the_book():
+    book = engine.init_book()
+    engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 1, 0, 7)
+    books = service.BookService(book)
+
+    order = books.pending_order(backend.gen_order)
+    assert order["Order ID"][0] == 8
+
+    # every caller sees the same waiting order until it is processed
+    assert books.pending_order(backend.gen_order) is order
+
+    books.process_pending_order(backend.process_order, backend.gen_order)
+    assert books.pending_order(backend.gen_order)["Order ID"][0] == 9
+    assert books.call(lambda b: b.next_id) == 10
+
+def test_read_returns_the_version_it_ran_on():
+    books = service.BookService()
+    books.submit_order(engine.LIMIT, engine.BUY, 100, 1, 0)
+    version, spread = books.read(engine.spread)
+
+    assert spread is None
+    assert tuple(version) == tuple(books.view().version)
+
+def test_books_are_loaded_from_their_snapshots(tmp_path):
+    book = engine.init_book()
+    engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 3, 0, 5)
+    backend.save_lob(book, service.snapshot_path(str(tmp_path), "x"))
+    registry = service.BookRegistry(lambda name: service.load_book(str(tmp_path), name))
+
+    assert registry.get("x").view().bids == ((100, 3, 1),)
+    assert registry.get("x").pending_order(backend.gen_order)["Order ID"][0] == 6
+    assert registry.get(service.DEFAULT_BOOK).view().bids == ()
+
+def test_registry_limit():
+    registry = service.BookRegistry(max_books=2)
+    registry.get("a")
+    registry.get("b")
+
+    with pytest.raises(service.TooManyBooks):
+        registry.get("c")
+
+    # books that are already open can still be used
+    assert registry.get("a") is registry.get("a")
+
+def test_cancel_runs_on_the_book_after_a_reset():
+    old_book = engine.init_book()
+    new_book = engine.init_book()
+    engine.submit_order(old_book, engine.LIMIT, engine.BUY, 100, 1, 0, 1)
+    engine.submit_order(new_book, engine.LIMIT, engine.BUY, 100, 1, 0, 1)
+    books = service.BookService(old_book)
+    started = threading.Event()
+    release = threading.Event()
+    statuses = []
+
+    def block(book):
+        started.set()
+        release.wait()
+
+    def queue(target, *args):
+        count = books.requests.qsize()
+        thread = threading.Thread(target=target, args=args)
+        thread.start()
+
+        while books.requests.qsize() == count:
+            time.sleep(0.001)
+
+        return thread
+
+    # the writer is held up while the reset and then the cancel are queued behind it
+    blocker = threading.Thread(target=books.call, args=(block,))
+    blocker.start()
+    started.wait()
+    threads = [blocker, queue(books.reset, new_book), queue(lambda: statuses.append(books.cancel_order(1)))]
+    release.set()
+
+    for thread in threads:
+        thread.join()
+
+    assert statuses == [engine.CANCELLED]
+    assert 1 not in new_book.orders
+    assert 1 in old_book.orders
@@ -0,0 +1,19 @@
+import backend
+import engine
+
+def resting(book):
+    return [(order.order_id, order.side, order.price, order.qty, order.time)
+            for book_side in (book.bids, book.asks) for order in engine.iter_orders(book_side)]
+
+def test_round_trip_keeps_nanosecond_times(tmp_path):
+    book = engine.init_book()
+    engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 5, 1700000000123456789)
+    engine.submit_order(book, engine.LIMIT, engine.SELL, 105, 3, 1700000000123456790)
+    engine.submit_order(book, engine.LIMIT, engine.BUY, 100, 2, 1700000000999999999)
+    path = str(tmp_path / "book.snap")
+
+    backend.save_lob(book, path)
+    loaded = backend.load_lob(path)
+
+    assert resting(loaded) == resting(book)
+    assert loaded.next_id == book.next_id